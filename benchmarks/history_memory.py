@@ -0,0 +1,85 @@
+"""
+コンテキスト履歴のメモリ使用量計測
+
+旧構成（deque + 4つの辞書）と HistoryStore のコンテキストあたりのバイト数を比較する。
+メッセージ本文は計測前に生成して共有し、保持構造自体のオーバーヘッドだけを測る。
+
+    python benchmarks/history_memory.py [--contexts 10000 100000]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.utils.history_store import HistoryStore  # noqa: E402
+
+MESSAGES_PER_CONTEXT = 10
+SPEAKERS_PER_CONTEXT = 5
+
+
+def _fixtures(contexts: int):
+    keys = [f"group:C{i:032x}" for i in range(contexts)]
+    texts = [f"メッセージ{i}" for i in range(MESSAGES_PER_CONTEXT)]
+    return keys, texts
+
+
+def _speaker(i: int, j: int) -> str:
+    # Webhook の JSON から毎回新しく生成される文字列を模す
+    return "".join(["U", f"{(i * SPEAKERS_PER_CONTEXT + j) % 5000:032x}"])
+
+
+def fill_legacy(keys, texts):
+    history, counts, summaries = {}, {}, {}
+    for i, key in enumerate(keys):
+        for n, text in enumerate(texts):
+            if key not in history:
+                history[key] = deque(maxlen=10)
+            history[key].append((_speaker(i, n % SPEAKERS_PER_CONTEXT), text))
+            counts[key] = counts.get(key, 0) + 1
+        summaries[key] = deque(["要約"], maxlen=10)
+    return history, counts, summaries
+
+
+def fill_store(keys, texts):
+    store = HistoryStore()
+    for i, key in enumerate(keys):
+        for n, text in enumerate(texts):
+            store.append(key, _speaker(i, n % SPEAKERS_PER_CONTEXT), text)
+        store.add_summary(key, "要約")
+    return store
+
+
+def measure(fill, keys, texts) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    state = fill(keys, texts)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del state
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contexts", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    for contexts in args.contexts:
+        keys, texts = _fixtures(contexts)
+        for label, fill in (("legacy", fill_legacy), ("store", fill_store)):
+            used = measure(fill, keys, texts)
+            print(
+                f"{contexts:>7} contexts {label:>7}: "
+                f"{used / contexts:8.1f} bytes/context ({used / 2**20:7.1f} MiB)"
+            )
+
+
+if __name__ == "__main__":
+    main()
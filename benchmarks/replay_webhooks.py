@@ -0,0 +1,206 @@
+"""
+記録した Webhook の再生による性能回帰テスト
+
+WEBHOOK_CAPTURE_PATH で記録した JSONL を、LINE / OpenAI をスタブに置き換えた
+アプリへ送り、スループット・レイテンシ分位点・状態メモリの増加を報告する。
+
+    python benchmarks/replay_webhooks.py capture.jsonl [--speed 1|N|0]
+        [--ai-latency 0.8] [--concurrency 8] [--trace-memory]
+
+--speed は 1 で記録時と同じ間隔、N で N 倍速、0 で間隔を無視した最大速度。
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+REPLAY_SECRET = "replay_secret"
+os.environ.setdefault("LINE_CHANNEL_SECRET", REPLAY_SECRET)
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "replay_token")
+os.environ.setdefault("OPENAI_API_KEY", "replay_key")
+os.environ["WEBHOOK_CAPTURE_PATH"] = ""  # 再生中は記録しない
+
+from linebot.v3.webhook import SignatureValidator  # noqa: E402
+
+from src import main  # noqa: E402
+from src.utils.metrics import percentile  # noqa: E402
+
+
+class StubLineService:
+    """LINE API を呼ばずに呼び出し回数だけ数える"""
+
+    def __init__(self):
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def reply_message(self, reply_token, text, push_to=None):
+        self._count("reply_message")
+
+    def mark_as_read(self, mark_as_read_token):
+        self._count("mark_as_read")
+
+    def get_message_content(self, message_id):
+        self._count("get_message_content")
+        return ""
+
+    def leave_group(self, group_id):
+        self._count("leave_group")
+
+    def leave_room(self, room_id):
+        self._count("leave_room")
+
+    def get_bot_info(self):
+        self._count("get_bot_info")
+        return "with4gent"
+
+    def __getattr__(self, name):
+        # 後から追加された API も no-op として扱う
+        def _noop(*args, **kwargs):
+            self._count(name)
+
+        return _noop
+
+
+class StubResponses:
+    """Responses API のスタブ（固定の遅延で固定の応答を返す）"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def create(self, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        input_chars = len(json.dumps(kwargs.get("input"), ensure_ascii=False))
+        return SimpleNamespace(
+            id=f"resp_{uuid.uuid4().hex}",
+            output_text="了解しました。" * 10,
+            usage=SimpleNamespace(input_tokens=input_chars // 2),
+        )
+
+
+def load_capture(path: str):
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def _refresh_timestamps(body: str) -> str:
+    """イベント時刻を送信時刻に置き換える（受信からの経過時間を正しく見せるため）"""
+    body_json = json.loads(body)
+    now_ms = int(time.time() * 1000)
+    for event in body_json.get("events") or []:
+        if "timestamp" in event:
+            event["timestamp"] = now_ms
+    return json.dumps(body_json, ensure_ascii=False)
+
+
+def _sign(body: str) -> str:
+    digest = hmac.new(
+        REPLAY_SECRET.encode("utf-8"), body.encode("utf-8"), hashlib.sha256
+    ).digest()
+    return base64.b64encode(digest).decode("utf-8")
+
+
+def _state_size() -> dict:
+    logic = main.chatbot_logic
+    return {
+        "contexts": len(logic._contexts),
+        "message_cache": len(logic._message_cache),
+        "chains": len(main.openai_service.previous_responses),
+    }
+
+
+def replay(records, speed: float, concurrency: int):
+    client = main.app.test_client()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def _send(body: str):
+        body = _refresh_timestamps(body)
+        start = time.perf_counter()
+        response = client.post(
+            "/webhook", data=body, headers={"X-Line-Signature": _sign(body)}
+        )
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    first_ts = records[0]["ts"] if records else 0.0
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for record in records:
+            if speed > 0:
+                due = (record["ts"] - first_ts) / speed
+                delay = due - (time.perf_counter() - wall_start)
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(_send, record["body"])
+    return time.perf_counter() - wall_start, latencies, statuses
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("capture")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--ai-latency", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--trace-memory", action="store_true")
+    args = parser.parse_args()
+
+    line_stub = StubLineService()
+    main.chatbot_logic.line = line_stub
+    main.openai_service.client = SimpleNamespace(
+        responses=StubResponses(args.ai_latency)
+    )
+    main.default_channel.validator = SignatureValidator(REPLAY_SECRET)
+
+    records = load_capture(args.capture)
+    events = sum(len(json.loads(r["body"]).get("events") or []) for r in records)
+
+    if args.trace_memory:
+        tracemalloc.start()
+    mem_before = tracemalloc.get_traced_memory()[0] if args.trace_memory else 0
+    state_before = _state_size()
+
+    wall, latencies, statuses = replay(records, args.speed, args.concurrency)
+
+    mem_after = tracemalloc.get_traced_memory()[0] if args.trace_memory else 0
+    state_after = _state_size()
+
+    print(f"requests       : {len(records)} ({events} events), status {statuses}")
+    print(f"wall time      : {wall:.2f} s (speed={args.speed or 'max'})")
+    print(f"throughput     : {len(records) / wall:.1f} req/s, ", end="")
+    print(f"{events / wall:.1f} events/s")
+    for q in (0.5, 0.95, 0.99):
+        print(
+            f"latency p{int(q * 100):<3}   : {percentile(latencies, q) * 1e3:8.2f} ms"
+        )
+    print(f"latency max    : {max(latencies, default=0) * 1e3:8.2f} ms")
+    print(f"state          : {state_before} -> {state_after}")
+    if args.trace_memory:
+        growth = (mem_after - mem_before) / 2**20
+        print(f"memory growth  : {growth:.2f} MiB (tracemalloc)")
+    print(f"upstream calls : {line_stub.calls}")
+
+
+if __name__ == "__main__":
+    main_cli()
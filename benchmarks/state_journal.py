@@ -0,0 +1,94 @@
+"""
+状態ジャーナルの計測
+
+イベントあたりの追記オーバーヘッド、圧縮でロックを保持する時間（全リクエストが
+止まる時間）、スナップショット + ジャーナルからの復元時間を測る。
+
+    python benchmarks/state_journal.py [--contexts 10000] [--events 100000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import Mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.logic import ChatbotLogic  # noqa: E402
+from src.services.state_journal import StateJournal  # noqa: E402
+
+
+def _build(directory: str, compact_every: int, fsync: bool):
+    journal = StateJournal(directory, compact_every=compact_every, fsync=fsync)
+    ai = Mock()
+    ai.summarize.return_value = "これまでの会話の要約です。" * 3
+    logic = ChatbotLogic(Mock(), ai, journal=journal)
+    return journal, logic
+
+
+def _feed(logic: ChatbotLogic, contexts: int, events: int):
+    for i in range(events):
+        context_key = f"group:G{i % contexts:032x}"
+        user_id = f"U{i % 997:032x}"
+        logic._update_caches(context_key, user_id, f"m{i}", "今日のランチどうする？")
+
+
+def _size(path: str) -> int:
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contexts", type=int, default=10000)
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--compact-every", type=int, default=50000)
+    parser.add_argument("--fsync", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # ジャーナルなしの基準値
+        _, baseline = _build(directory, args.compact_every, args.fsync)
+        baseline._journal = None
+        start = time.perf_counter()
+        _feed(baseline, args.contexts, args.events)
+        base_us = (time.perf_counter() - start) / args.events * 1e6
+
+        journal, logic = _build(directory, args.compact_every, args.fsync)
+        start = time.perf_counter()
+        _feed(logic, args.contexts, args.events)
+        with_us = (time.perf_counter() - start) / args.events * 1e6
+        journal.close()
+
+        snapshot_size = _size(journal.snapshot_path)
+        journal_size = _size(journal.journal_path)
+
+        restored, _ = _build(directory, args.compact_every, args.fsync)
+        restored.restore()
+        stats = restored.stats()
+        # 全コンテキストが載った状態での圧縮1回分（書き出し完了まで）
+        start = time.perf_counter()
+        restored.compact()
+        compact_ms = (time.perf_counter() - start) * 1e3
+        pause_ms = restored.stats()["last_compaction_pause_ms"]
+        restored.close()
+
+    print(f"event without journal : {base_us:8.2f} us")
+    print(f"event with journal    : {with_us:8.2f} us")
+    print(f"journal append (avg)  : {journal.stats()['avg_write_us']:8.2f} us")
+    print(f"compactions           : {journal.stats()['compactions']}")
+    print(
+        f"compaction pause      : {pause_ms:8.2f} ms "
+        f"(max while feeding {journal.stats()['max_compaction_pause_ms']:.2f} ms, "
+        f"until written {compact_ms:.2f} ms)"
+    )
+    print(f"snapshot / journal    : {snapshot_size} / {journal_size} bytes")
+    print(
+        f"restore               : {stats['restore_seconds'] * 1e3:8.2f} ms "
+        f"({stats['restored_records']} journal records replayed)"
+    )
+
+
+if __name__ == "__main__":
+    main()
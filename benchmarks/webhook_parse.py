@@ -0,0 +1,125 @@
+"""
+Webhook ボディのパースコスト計測
+
+SDK の全イベントモデル化（従来の WebhookParser 相当）と、
+prefilter_events による事前振り分け + 必要分のみモデル化を比較する。
+
+    python benchmarks/webhook_parse.py [--events 100] [--rounds 200]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from linebot.v3.webhooks import Event  # noqa: E402
+
+from src.utils.webhook_prefilter import prefilter_events  # noqa: E402
+
+
+def _source(i: int) -> dict:
+    return {"type": "group", "groupId": f"G{i % 20:032x}", "userId": f"U{i:032x}"}
+
+
+def _base(i: int, event_type: str) -> dict:
+    return {
+        "type": event_type,
+        "mode": "active",
+        "timestamp": 1700000000000 + i,
+        "source": _source(i),
+        "webhookEventId": f"01H{i:023d}",
+        "deliveryContext": {"isRedelivery": False},
+    }
+
+
+def build_body(n: int, seed: int = 0) -> str:
+    """混雑したグループを想定したイベント構成（大半がメンションなし）"""
+    rnd = random.Random(seed)
+    events = []
+    for i in range(n):
+        r = rnd.random()
+        if r < 0.70:
+            kind = "plain"
+        elif r < 0.80:
+            kind = "mention"
+        elif r < 0.90:
+            kind = "sticker"
+        elif r < 0.97:
+            kind = "image"
+        else:
+            kind = "unfollow"
+
+        if kind == "unfollow":
+            events.append(_base(i, "unfollow"))
+            continue
+
+        event = _base(i, "message")
+        event["replyToken"] = f"{i:032x}"
+        if kind == "sticker":
+            event["message"] = {
+                "type": "sticker",
+                "id": str(i),
+                "quoteToken": "q",
+                "packageId": "1",
+                "stickerId": "1",
+                "stickerResourceType": "STATIC",
+            }
+        elif kind == "image":
+            event["message"] = {
+                "type": "image",
+                "id": str(i),
+                "quoteToken": "q",
+                "contentProvider": {"type": "line"},
+            }
+        else:
+            text = "今日のランチどうする？" * rnd.randint(1, 4)
+            message = {"type": "text", "id": str(i), "quoteToken": "q", "text": text}
+            if kind == "mention":
+                message["text"] = "@bot " + text
+                message["mention"] = {
+                    "mentionees": [
+                        {"index": 0, "length": 4, "type": "user", "isSelf": True}
+                    ]
+                }
+            event["message"] = message
+        events.append(event)
+    return json.dumps({"destination": "U" + "0" * 32, "events": events})
+
+
+def parse_full(body: str) -> int:
+    body_json = json.loads(body)
+    return len([Event.from_dict(e) for e in body_json["events"]])
+
+
+def parse_prefiltered(body: str) -> int:
+    payload = prefilter_events(body)
+    return len([Event.from_dict(e) for e in payload.full_events])
+
+
+def _measure(func, body: str, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(body)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    body = build_body(args.events)
+    total = args.events * args.rounds
+    for label, func in (("full", parse_full), ("prefilter", parse_prefiltered)):
+        func(body)  # warm up
+        elapsed = _measure(func, body, args.rounds)
+        print(f"{label:>10}: {elapsed / total * 1e6:8.2f} us/event")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+設定からサービス一式を組み立てる（main.py とシャードワーカーで共通）
+"""
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+from src.logic import ChatbotLogic
+from src.services.delivery import DeliveryTracker
+from src.services.latency_controller import LatencyController
+from src.services.line_service import LineService
+from src.services.openai_service import OpenAIService
+from src.services.state_journal import StateJournal
+from src.services.turn_router import TurnRouter
+
+if TYPE_CHECKING:
+    # Config は import 時に環境変数を読むため、実行時にはここで読み込まない
+    from src.config import Config
+
+
+@dataclass
+class Services:
+    journal: Optional[StateJournal]
+    line: LineService
+    openai: OpenAIService
+    router: TurnRouter
+    controller: LatencyController
+    delivery: DeliveryTracker
+    logic: ChatbotLogic
+
+
+def build_services(config: "Config", journal_dir: str = "") -> Services:
+    """
+    サービスを組み立てる。journal_dir が空の場合は状態を永続化しない。
+    ジャーナルの復元（restore）は、他の持ち主を bind し終えてから呼び出し側で行う。
+    """
+    journal = (
+        StateJournal(journal_dir, config.state_compact_every) if journal_dir else None
+    )
+    line_service = LineService(config.line_channel_access_token)
+    openai_service = OpenAIService(
+        config.openai_api_key,
+        journal=journal,
+        max_chain_turns=config.session_max_turns,
+        max_chain_input_tokens=config.session_max_input_tokens,
+    )
+    router = (
+        TurnRouter.from_file(config.routing_rules_path)
+        if config.routing_rules_path
+        else TurnRouter()
+    )
+    controller = LatencyController(target_p95=config.latency_target_p95_ms / 1000)
+    delivery = DeliveryTracker(reply_deadline=config.reply_deadline_ms / 1000)
+    logic = ChatbotLogic(
+        line_service,
+        openai_service,
+        journal=journal,
+        router=router,
+        controller=controller,
+        delivery=delivery,
+    )
+    return Services(
+        journal=journal,
+        line=line_service,
+        openai=openai_service,
+        router=router,
+        controller=controller,
+        delivery=delivery,
+        logic=logic,
+    )
@@ -0,0 +1,209 @@
+"""
+1プロセスで複数の LINE チャネルを扱うためのチャネル定義と振り分け
+
+チャネルごとにシークレット・アクセストークン・セッションの名前空間を分け、
+OpenAIService（接続プール）・ターン振り分け・劣化制御・ジャーナルは共有する。
+同時処理数はチャネルごとの上限（max_concurrency）で制限する。
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+from linebot.v3.webhook import SignatureValidator
+
+from src.logic import ChatbotLogic
+from src.services.delivery import DeliveryTracker
+from src.services.latency_controller import LatencyController
+from src.services.line_service import LineService
+from src.services.openai_service import OpenAIService
+from src.services.state_journal import StateJournal
+from src.services.turn_router import TurnRouter
+from src.utils.metrics import percentile
+
+# チャネルごとに保持するリクエスト処理時間のサンプル数
+LATENCY_WINDOW = 500
+# LINE_CHANNEL_* で設定する既定チャネルの名前
+DEFAULT_CHANNEL = "default"
+
+
+@dataclass(frozen=True)
+class ChannelSpec:
+    name: str
+    channel_secret: str
+    access_token: str
+    # Webhook ボディの destination（Bot のユーザーID）。/webhook での振り分けに使う
+    destination: str = ""
+    # このチャネルが同時に処理できるリクエスト数（0 の場合は無制限）
+    max_concurrency: int = 8
+
+
+def _value(entry: Dict[str, Any], key: str) -> str:
+    """値そのもの、または "<key>_env" で指定した環境変数から読む"""
+    if entry.get(f"{key}_env"):
+        return os.environ.get(entry[f"{key}_env"], "")
+    return entry.get(key, "")
+
+
+def load_channels(path: str) -> List[ChannelSpec]:
+    """
+    JSON ファイルからチャネル定義を読み込む。
+
+    {"channels": [{"name": "shop", "destination": "U0123...",
+                   "channel_secret_env": "SHOP_SECRET",
+                   "access_token_env": "SHOP_TOKEN", "max_concurrency": 4}]}
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    specs = [
+        ChannelSpec(
+            name=c["name"],
+            channel_secret=_value(c, "channel_secret"),
+            access_token=_value(c, "access_token"),
+            destination=c.get("destination", ""),
+            max_concurrency=c.get("max_concurrency", 8),
+        )
+        for c in data.get("channels", [])
+    ]
+    names = [spec.name for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError("duplicate channel name")
+    # 空のシークレットでは署名検証が意味をなさないため、起動時に弾く
+    for spec in specs:
+        if not spec.channel_secret or not spec.access_token:
+            raise ValueError(
+                f"channel {spec.name}: channel_secret/access_token is empty"
+            )
+    return specs
+
+
+class ChannelStats:
+    """チャネルごとのリクエスト数・イベント数・上限超過数・処理時間"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self._requests = 0
+        self._events = 0
+        self._throttled = 0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, events: int, seconds: float):
+        with self._lock:
+            self._requests += 1
+            self._events += events
+            self._latencies.append(seconds)
+
+    def record_throttled(self):
+        with self._lock:
+            self._throttled += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            uptime = max(time.monotonic() - self._started_at, 1e-9)
+            return {
+                "requests": self._requests,
+                "events": self._events,
+                "throttled": self._throttled,
+                "events_per_sec": self._events / uptime,
+                "p50_ms": percentile(self._latencies, 0.5) * 1e3,
+                "p95_ms": percentile(self._latencies, 0.95) * 1e3,
+            }
+
+
+class Channel:
+    def __init__(self, spec: ChannelSpec, logic: ChatbotLogic):
+        self.spec = spec
+        self.logic = logic
+        self.validator = SignatureValidator(spec.channel_secret)
+        self.stats = ChannelStats()
+        self._slots = (
+            threading.BoundedSemaphore(spec.max_concurrency)
+            if spec.max_concurrency > 0
+            else None
+        )
+
+    @property
+    def name(self) -> str:
+        return self.spec.name
+
+    def try_acquire(self) -> bool:
+        """同時処理数の上限内であれば枠を確保する（待たない）"""
+        if self._slots is None or self._slots.acquire(blocking=False):
+            return True
+        self.stats.record_throttled()
+        return False
+
+    def release(self):
+        if self._slots is not None:
+            self._slots.release()
+
+
+class ChannelRegistry:
+    """
+    チャネル名（/webhook/<name>）と destination からチャネルを引く。
+    default を指定した場合、destination が一致しないボディは default で処理する。
+    """
+
+    def __init__(self, channels: List[Channel], default: Optional[Channel] = None):
+        self.default = default
+        if default:
+            channels = [default, *channels]
+        names = [c.name for c in channels]
+        if len(set(names)) != len(names):
+            raise ValueError("duplicate channel name")
+        self._by_name = {c.name: c for c in channels}
+        self._by_destination = {
+            c.spec.destination: c for c in channels if c.spec.destination
+        }
+
+    @classmethod
+    def build(
+        cls,
+        specs: List[ChannelSpec],
+        openai_service: OpenAIService,
+        journal: Optional[StateJournal] = None,
+        router: Optional[TurnRouter] = None,
+        controller: Optional[LatencyController] = None,
+        reply_deadline: float = 50.0,
+        default: Optional[Channel] = None,
+    ) -> "ChannelRegistry":
+        channels = [
+            Channel(
+                spec,
+                ChatbotLogic(
+                    LineService(spec.access_token),
+                    openai_service,
+                    journal=journal,
+                    router=router,
+                    controller=controller,
+                    delivery=DeliveryTracker(reply_deadline=reply_deadline),
+                    namespace=spec.name,
+                ),
+            )
+            for spec in specs
+        ]
+        return cls(channels, default=default)
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def get(self, name: str) -> Optional[Channel]:
+        return self._by_name.get(name)
+
+    def for_destination(self, destination: Optional[str]) -> Optional[Channel]:
+        channel = self._by_destination.get(destination) if destination else None
+        return channel or self.default
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                **channel.stats.stats(),
+                "delivery": channel.logic.delivery.stats()["paths"],
+            }
+            for name, channel in self._by_name.items()
+        }
@@ -8,6 +8,32 @@ class Config:
     line_channel_secret: str = os.environ.get("LINE_CHANNEL_SECRET", "")
     openai_api_key: str = os.environ.get("OPENAI_API_KEY", "")
     port: int = int(os.environ.get("PORT", 8080))
+    # 状態ジャーナルの保存先（空の場合は永続化しない）
+    state_journal_dir: str = os.environ.get("STATE_JOURNAL_DIR", "")
+    state_compact_every: int = int(os.environ.get("STATE_COMPACT_EVERY", 1000))
+    # ターン振り分けルールの JSON ファイル（空の場合は組み込みルール）
+    routing_rules_path: str = os.environ.get("ROUTING_RULES_PATH", "")
+    # レスポンスチェーンのローテーション閾値（ターン数 / 直近ターンの入力トークン数）
+    session_max_turns: int = int(os.environ.get("SESSION_MAX_TURNS", 40))
+    session_max_input_tokens: int = int(
+        os.environ.get("SESSION_MAX_INPUT_TOKENS", 12000)
+    )
+    # 応答全体の p95 目標（ミリ秒）。超過時は省略可能な処理を段階的に止める
+    latency_target_p95_ms: int = int(os.environ.get("LATENCY_TARGET_P95_MS", 8000))
+    # イベント発生からこの時間（ミリ秒）を過ぎたら返信ではなくプッシュで送る
+    reply_deadline_ms: int = int(os.environ.get("REPLY_DEADLINE_MS", 50000))
+    # 匿名化した Webhook ボディの記録先 JSONL（空の場合は記録しない）
+    webhook_capture_path: str = os.environ.get("WEBHOOK_CAPTURE_PATH", "")
+    # /debug/* エンドポイントの認証トークン（空の場合は無効）
+    debug_token: str = os.environ.get("DEBUG_TOKEN", "")
+    # 既定チャネル（LINE_CHANNEL_*）が同時に処理できるリクエスト数（0 の場合は無制限）
+    line_max_concurrency: int = int(os.environ.get("LINE_MAX_CONCURRENCY", 0))
+    # 複数チャネルの定義 JSON（空の場合は上記の単一チャネルのみ）
+    channels_config_path: str = os.environ.get("CHANNELS_CONFIG_PATH", "")
+    # コンテキスト単位でシャーディングするワーカープロセス数（0 の場合は単一プロセス）
+    shard_workers: int = int(os.environ.get("SHARD_WORKERS", 0))
+    # ワーカーごとの処理スレッド数
+    shard_threads: int = int(os.environ.get("SHARD_THREADS", 8))
 
 
 config = Config()
@@ -1,40 +1,74 @@
-from collections import deque
-from typing import Deque, Dict, List, Tuple
-
-from linebot.v3.webhooks import JoinEvent, MessageEvent, TextMessageContent
-
-from src.services.line_service import LineService
+import time
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+from linebot.v3.webhooks import Event, JoinEvent, MessageEvent, TextMessageContent
+
+from src.services.delivery import (
+    PATH_PUSH,
+    PATH_REPLY,
+    PATH_REPLY_FAILED_PUSH,
+    DeliveryTracker,
+)
+from src.services.latency_controller import LatencyController
+from src.services.line_service import LineService, ReplyTokenError
 from src.services.openai_service import OpenAIService
+from src.services.state_journal import StateJournal
+from src.services.turn_router import Route, TurnRouter
 from src.utils.anonymizer import anonymize_text
+from src.utils.history_store import HISTORY_SIZE, HistoryStore
+from src.utils.webhook_prefilter import LightMessage
+
+JOURNAL_NAME = "logic"
+
+T = TypeVar("T")
 
 
 class ChatbotLogic:
-    def __init__(self, line_service: LineService, openai_service: OpenAIService):
+    def __init__(
+        self,
+        line_service: LineService,
+        openai_service: OpenAIService,
+        journal: Optional[StateJournal] = None,
+        router: Optional[TurnRouter] = None,
+        controller: Optional[LatencyController] = None,
+        delivery: Optional[DeliveryTracker] = None,
+        namespace: str = "",
+    ):
         self.line = line_service
         self.ai = openai_service
+        self._journal = journal
+        # 複数チャネルで OpenAIService 等を共有する場合の context_key の接頭辞
+        self.namespace = namespace
+        self._journal_name = (
+            f"{JOURNAL_NAME}:{namespace}" if namespace else JOURNAL_NAME
+        )
+        # ターンごとのモデル・Web検索・出力上限の振り分け
+        self.router = router or TurnRouter()
+        # 負荷時に省略可能な処理を段階的に止める
+        self.controller = controller or LatencyController()
+        # イベントの経過時間に応じた送信経路（返信 / プッシュ）の選択と計測
+        self.delivery = delivery or DeliveryTracker()
         # メッセージIDからテキスト内容を引くためのキャッシュ（引用解決用）
         self._message_cache: Dict[str, str] = {}  # {message_id: text}
-        # コンテキストごとの会話履歴（メンションなしメッセージも含む）
-        self._context_history: Dict[str, Deque[Tuple[str, str]]] = {}
-        # コンテキストごとのメッセージ受信累計（サマライズ用）
-        self._message_counts: Dict[str, int] = {}
-        # コンテキストごとのサマリー履歴
-        self._context_summaries: Dict[str, Deque[str]] = {}
+        # コンテキストごとの会話履歴（メンションなしメッセージも含む）・
+        # メッセージ受信累計（サマライズ用）・サマリー履歴
+        self._contexts = HistoryStore()
+        if journal:
+            journal.bind(self._journal_name, self)
 
     def process_event(self, event: MessageEvent):
         if not isinstance(event.message, TextMessageContent):
             return
 
+        started_at = time.perf_counter()
         context_key = self._get_context_key(event)
         raw_text = event.message.text or ""
-        self._update_caches(event, context_key, raw_text)
+        message_id = getattr(event.message, "id", None)
+        user_id = event.source.user_id if event.source.user_id else "unknown"
+        self._update_caches(context_key, user_id, message_id, raw_text)
 
         # 既読処理
-        mark_as_read_token = getattr(event.message, "mark_as_read_token", None)
-        try:
-            self.line.mark_as_read(mark_as_read_token)
-        except Exception:
-            pass
+        self._mark_as_read(getattr(event.message, "mark_as_read_token", None))
 
         # group/room ではメンション必須
         mentioned = self._is_mentioned_to_me(event)
@@ -49,13 +83,63 @@ class ChatbotLogic:
             return
 
         # 通常会話
+        route = self.controller.apply(self.router.classify(clean_text or raw_text))
         user_message = self._prepare_ai_input(context_key, clean_text, raw_text)
-        self._send_ai_response(event, context_key, user_message)
+        self._send_ai_response(event, context_key, user_message, route)
+        self.controller.record("total", time.perf_counter() - started_at)
+
+    def record_message(self, message: LightMessage):
+        """履歴への追加のみが必要なメッセージを処理（SDK モデルへの変換を省略）"""
+        self._update_caches(
+            self._scoped(message.context_key),
+            message.user_id,
+            message.message_id,
+            message.text,
+        )
+        self._mark_as_read(message.mark_as_read_token)
 
-    def _update_caches(self, event: MessageEvent, context_key: str, raw_text: str):
-        message_id = getattr(event.message, "id", None)
-        user_id = event.source.user_id if event.source.user_id else "unknown"
+    def _mark_as_read(self, mark_as_read_token: Optional[str]):
+        try:
+            self.line.mark_as_read(mark_as_read_token)
+        except Exception:
+            pass
 
+    def _update_caches(
+        self,
+        context_key: str,
+        user_id: str,
+        message_id: Optional[str],
+        raw_text: str,
+    ):
+        count = self._journaled(
+            "hist",
+            lambda: self._append_history(context_key, user_id, message_id, raw_text),
+            context_key,
+            user_id,
+            message_id,
+            raw_text,
+        )
+
+        # サマライズ判定（高負荷時は省略）
+        if count % 10 == 0 and not self.controller.skip_summarization:
+            start = time.perf_counter()
+            summary = self.ai.summarize(context_key)
+            self.controller.record("summarize", time.perf_counter() - start)
+            if summary:
+                self._journaled(
+                    "summary",
+                    lambda: self._append_summary(context_key, summary),
+                    context_key,
+                    summary,
+                )
+
+    def _append_history(
+        self,
+        context_key: str,
+        user_id: str,
+        message_id: Optional[str],
+        raw_text: str,
+    ) -> int:
         # キャッシュに保存（引用解決用）
         if message_id:
             self._message_cache[message_id] = raw_text
@@ -63,19 +147,55 @@ class ChatbotLogic:
                 oldest_key = next(iter(self._message_cache))
                 self._message_cache.pop(oldest_key)
 
-        # コンテキスト履歴に保存
-        if context_key not in self._context_history:
-            self._context_history[context_key] = deque(maxlen=10)
-        self._context_history[context_key].append((user_id, raw_text))
+        # コンテキスト履歴に保存し、メッセージカウントを返す
+        return self._contexts.append(context_key, user_id, raw_text)
 
-        # メッセージカウントの更新とサマライズ判定
-        self._message_counts[context_key] = self._message_counts.get(context_key, 0) + 1
-        if self._message_counts[context_key] % 10 == 0:
-            summary = self.ai.summarize(context_key)
-            if summary:
-                if context_key not in self._context_summaries:
-                    self._context_summaries[context_key] = deque(maxlen=10)
-                self._context_summaries[context_key].append(summary)
+    def _append_summary(self, context_key: str, summary: str):
+        self._contexts.add_summary(context_key, summary)
+
+    def _reset_context(self, context_key: str):
+        self._contexts.reset(context_key)
+
+    def _record_reset(self, context_key: str):
+        self._journaled("reset", lambda: self._reset_context(context_key), context_key)
+
+    def _journaled(self, op: str, change: Callable[[], T], *args) -> T:
+        """状態を変更し、ジャーナルがあれば同じロックの中で記録する"""
+        if self._journal:
+            return self._journal.apply(self._journal_name, op, change, *args)
+        return change()
+
+    def export_state(self) -> dict:
+        """ジャーナルのスナップショット用に状態を書き出す"""
+        return {
+            "message_cache": dict(self._message_cache),
+            "contexts": self._contexts.export_state(),
+        }
+
+    def import_state(self, state: dict):
+        """スナップショットから状態を復元する"""
+        self._message_cache = dict(state["message_cache"])
+        if "contexts" in state:
+            self._contexts.import_state(state["contexts"])
+            return
+        # 旧形式（履歴・カウント・サマリーを別々の辞書で保持）のスナップショット
+        counts = state["message_counts"]
+        summaries = state["context_summaries"]
+        self._contexts.import_state(
+            {
+                k: (v, counts.get(k, 0), summaries.get(k, []))
+                for k, v in state["context_history"].items()
+            }
+        )
+
+    def apply_journal_record(self, op: str, args: list):
+        """ジャーナルの1行を再適用する（サマライズ等の副作用は起こさない）"""
+        if op == "hist":
+            self._append_history(*args)
+        elif op == "summary":
+            self._append_summary(*args)
+        elif op == "reset":
+            self._reset_context(*args)
 
     def _get_clean_text(self, message: TextMessageContent, raw_text: str) -> str:
         ranges = self._self_mention_ranges(message)
@@ -89,8 +209,7 @@ class ChatbotLogic:
 
     def _handle_exit_command(self, event: MessageEvent, context_key: str):
         self.ai.clear_session(context_key)
-        self._message_counts.pop(context_key, None)
-        self._context_summaries.pop(context_key, None)
+        self._record_reset(context_key)
         if not self._is_group_like(event):
             self.line.reply_message(
                 event.reply_token, "会話セッションをリセットしました。"
@@ -107,16 +226,17 @@ class ChatbotLogic:
         user_message = clean_text if clean_text else raw_text
 
         # 1. これまでの会話のサマリー（コンテキスト圧縮）
-        summaries = self._context_summaries.get(context_key, [])
+        summaries = self._contexts.summaries(context_key)
         summary_lines = []
         if summaries:
             for i, s in enumerate(summaries):
                 summary_lines.append(f"要約{i + 1}: {s}")
 
-        # 2. 直近の会話履歴
-        history = self._context_history.get(context_key, [])
+        # 2. 直近の会話履歴（高負荷時は件数を絞る）
+        history = self._contexts.history(context_key)
+        limit = self.controller.history_limit(HISTORY_SIZE)
         context_lines = []
-        for h_user_id, h_text in list(history)[:-1]:  # 最新（自分）以外
+        for h_user_id, h_text in history[:-1][-limit:]:  # 最新（自分）以外
             h_text_anon = anonymize_text(h_text)
             context_lines.append(f"ユーザー({h_user_id[-4:]}): {h_text_anon}")
 
@@ -139,18 +259,59 @@ class ChatbotLogic:
         return anonymize_text(user_message)
 
     def _send_ai_response(
-        self, event: MessageEvent, context_key: str, user_message: str
+        self, event: MessageEvent, context_key: str, user_message: str, route: Route
     ):
+        push_to = self._get_push_target(event)
+        # ローディング表示は1対1のトークのみ対応
+        if event.source.type == "user" and push_to and self.line.show_loading(push_to):
+            self.delivery.record_loading()
         try:
-            bot_message = self.ai.get_response(context_key, user_message)
+            start = time.perf_counter()
+            bot_message = self.ai.get_response(context_key, user_message, route=route)
+            elapsed = time.perf_counter() - start
+            self.router.record(route, elapsed)
+            self.controller.record("ai", elapsed)
+
             bot_message = anonymize_text(bot_message)
-            self.line.reply_message(event.reply_token, bot_message)
+            start = time.perf_counter()
+            self._deliver(event, bot_message, push_to)
+            self.controller.record("reply", time.perf_counter() - start)
         except Exception:
-            self.line.reply_message(
-                event.reply_token,
+            self._deliver(
+                event,
                 "申し訳ございません。エラーが発生しました。しばらくしてからもう一度お試しください。",
+                push_to,
             )
 
+    def _deliver(self, event: MessageEvent, text: str, push_to: Optional[str]):
+        """
+        返信トークンが有効なうちは返信し、期限切れが近い・返信に失敗した場合は
+        送信先（ユーザー/グループ/ルーム）へプッシュする。
+        """
+        age = self.delivery.event_age(event)
+        if push_to and self.delivery.should_push(age):
+            self.line.push_message(push_to, text)
+            self.delivery.record(PATH_PUSH, age)
+            return
+        try:
+            self.line.reply_message(event.reply_token, text, push_to=push_to)
+        except ReplyTokenError:
+            if not push_to:
+                raise
+            self.line.push_message(push_to, text)
+            self.delivery.record(PATH_REPLY_FAILED_PUSH, age)
+            return
+        self.delivery.record(PATH_REPLY, age)
+
+    def handle_event(self, event: Event):
+        """SDK モデル化したイベントを種類ごとの処理へ振り分ける"""
+        if isinstance(event, MessageEvent) and isinstance(
+            event.message, TextMessageContent
+        ):
+            self.process_event(event)
+        elif isinstance(event, JoinEvent):
+            self.handle_join(event)
+
     def handle_join(self, event: JoinEvent):
         """グループ/ルーム参加時の処理"""
         bot_name = self.line.get_bot_info()
@@ -179,10 +340,22 @@ class ChatbotLogic:
     def _get_context_key(self, event: MessageEvent) -> str:
         src = event.source
         if src.type == "group":
-            return f"group:{src.group_id}"
+            return self._scoped(f"group:{src.group_id}")
+        if src.type == "room":
+            return self._scoped(f"room:{src.room_id}")
+        return self._scoped(f"user:{src.user_id}")
+
+    def _scoped(self, context_key: str) -> str:
+        return f"{self.namespace}/{context_key}" if self.namespace else context_key
+
+    def _get_push_target(self, event: MessageEvent) -> Optional[str]:
+        """プッシュメッセージの送信先（グループ/ルーム/ユーザーID）"""
+        src = event.source
+        if src.type == "group":
+            return src.group_id
         if src.type == "room":
-            return f"room:{src.room_id}"
-        return f"user:{src.user_id}"
+            return src.room_id
+        return src.user_id
 
     def _is_group_like(self, event: MessageEvent) -> bool:
         return event.source.type in ("group", "room")
@@ -3,24 +3,97 @@ with4gent - LINE Bot with OpenAI Integration
 Version: 2.1.0
 """
 
-from flask import Flask, abort, request
-from linebot.v3 import WebhookHandler
-from linebot.v3.exceptions import InvalidSignatureError
-from linebot.v3.webhooks import JoinEvent, MessageEvent, TextMessageContent
+import hmac
+import json
+import multiprocessing
+import time
+from typing import Any, Dict, Optional
 
+from flask import Flask, abort, request
+from linebot.v3.webhooks import Event
+
+from src.bootstrap import build_services
+from src.channels import (
+    DEFAULT_CHANNEL,
+    Channel,
+    ChannelRegistry,
+    ChannelSpec,
+    load_channels,
+)
 from src.config import config
 from src.logic import ChatbotLogic
-from src.services.line_service import LineService
-from src.services.openai_service import OpenAIService
+from src.sharding import ShardPool
+from src.utils.profiler import MODES, ProfilerBusyError, ProfilerManager
+from src.utils.webhook_prefilter import (
+    KIND_LIGHT,
+    PrefilteredPayload,
+    prefilter_parsed,
+)
+from src.utils.webhook_recorder import WebhookRecorder
 
 app = Flask(__name__)
 
-# サービスの初期化
-line_service = LineService(config.line_channel_access_token)
-openai_service = OpenAIService(config.openai_api_key)
-chatbot_logic = ChatbotLogic(line_service, openai_service)
+# シャーディング時は状態をワーカー側で持つため、フロントではジャーナルを使わない
+sharded = config.shard_workers > 0
+if sharded and config.channels_config_path:
+    raise ValueError("SHARD_WORKERS and CHANNELS_CONFIG_PATH cannot be combined")
 
-handler = WebhookHandler(config.line_channel_secret)
+# サービスの初期化
+services = build_services(config, "" if sharded else config.state_journal_dir)
+state_journal = services.journal
+line_service = services.line
+openai_service = services.openai
+turn_router = services.router
+latency_controller = services.controller
+delivery_tracker = services.delivery
+chatbot_logic = services.logic
+# 既定チャネル（LINE_CHANNEL_*）も追加チャネルと同じく計測・同時処理数の上限を持つ
+default_channel = Channel(
+    ChannelSpec(
+        DEFAULT_CHANNEL,
+        config.line_channel_secret,
+        config.line_channel_access_token,
+        max_concurrency=config.line_max_concurrency,
+    ),
+    chatbot_logic,
+)
+# 追加チャネル（OpenAIService・振り分け・劣化制御・ジャーナルを共有する）
+channel_registry = ChannelRegistry.build(
+    load_channels(config.channels_config_path) if config.channels_config_path else [],
+    openai_service,
+    journal=state_journal,
+    router=turn_router,
+    controller=latency_controller,
+    reply_deadline=config.reply_deadline_ms / 1000,
+    default=default_channel,
+)
+if state_journal:
+    # 前回プロセスの状態を復元（ウォームリスタート）
+    state_journal.restore()
+
+signature_validator = default_channel.validator
+profiler = ProfilerManager()
+webhook_recorder = (
+    WebhookRecorder(config.webhook_capture_path)
+    if config.webhook_capture_path
+    else None
+)
+
+# spawn で起動したワーカーは main を再 import するため、プールはフロントでのみ作る
+shard_pool = (
+    ShardPool(
+        config.shard_workers,
+        journal_dir=config.state_journal_dir,
+        threads=config.shard_threads,
+    )
+    if sharded and multiprocessing.parent_process() is None
+    else None
+)
+
+# /debug/profile で同期実行できる最大秒数
+MAX_PROFILE_SECONDS = 60
+# ?events=N の計測を打ち切るまでの秒数
+PROFILE_EVENTS_TIMEOUT = 300
 
 
 @app.route("/health", methods=["GET"])
@@ -29,30 +102,142 @@ def health():
     return {"status": "ok"}
 
 
+def require_debug_token():
+    """DEBUG_TOKEN による認証（未設定時はエンドポイント自体を無効化）"""
+    if not config.debug_token:
+        abort(404)
+    auth = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(auth, f"Bearer {config.debug_token}"):
+        abort(401)
+
+
+@app.route("/debug/stats", methods=["GET"])
+def debug_stats():
+    """ルーティング・ジャーナル等の計測値"""
+    require_debug_token()
+    return {
+        "routes": turn_router.stats(),
+        "latency": latency_controller.stats(),
+        "delivery": delivery_tracker.stats(),
+        "usage": openai_service.usage_stats(),
+        "journal": state_journal.stats() if state_journal else None,
+        "shards": shard_pool.stats() if shard_pool else None,
+        "channels": channel_registry.stats(),
+    }
+
+
+@app.route("/debug/profile", methods=["POST"])
+def debug_profile_start():
+    """
+    プロファイラを実行する。
+    - ?seconds=N: N 秒間プロファイルして結果を返す
+    - ?events=N: 次の N 件の Webhook イベントだけをプロファイルする（結果は GET で取得。
+      期限内に N 件に達しなければ打ち切る。シャーディング時は使えない）
+    - ?mode=cpu|alloc: CPU サンプリング（collapsed stacks）/ アロケーション上位
+    """
+    require_debug_token()
+    mode = request.args.get("mode", "cpu")
+    seconds = request.args.get("seconds", type=float)
+    events = request.args.get("events", type=int)
+    if mode not in MODES or (seconds is None) == (events is None):
+        abort(400)
+
+    try:
+        if events is not None:
+            # シャーディング時のイベント処理はワーカープロセスで行われ、計測できない
+            if events <= 0 or shard_pool:
+                abort(400)
+            profiler.arm(events, mode, timeout=PROFILE_EVENTS_TIMEOUT)
+            return {"status": "armed", "mode": mode, "events": events}, 202
+        if not 0 < seconds <= MAX_PROFILE_SECONDS:
+            abort(400)
+        result = profiler.run_for(seconds, mode)
+    except ProfilerBusyError:
+        abort(409)
+    return result, 200, {"Content-Type": "text/plain; charset=utf-8"}
+
+
+@app.route("/debug/profile", methods=["GET"])
+def debug_profile_result():
+    """直近のプロファイル結果（実行中は 202）"""
+    require_debug_token()
+    if profiler.running:
+        return {"status": "running"}, 202
+    result = profiler.result()
+    if result is None:
+        abort(404)
+    return result, 200, {"Content-Type": "text/plain; charset=utf-8"}
+
+
 @app.route("/webhook", methods=["POST"])
 def webhook():
     """LINE Webhook エンドポイント"""
     signature = request.headers.get("X-Line-Signature", "")
     body = request.get_data(as_text=True)
+    body_json = _parse_body(body)
+    # destination（Bot のユーザーID）が追加チャネルのものであればそちらで処理
+    channel = channel_registry.for_destination(
+        body_json.get("destination") if body_json else None
+    )
+    return _channel_webhook(channel, body, body_json, signature)
+
+
+@app.route("/webhook/<name>", methods=["POST"])
+def channel_webhook(name: str):
+    """チャネル名で振り分ける LINE Webhook エンドポイント"""
+    channel = channel_registry.get(name)
+    if not channel:
+        abort(404)
+    signature = request.headers.get("X-Line-Signature", "")
+    body = request.get_data(as_text=True)
+    return _channel_webhook(channel, body, _parse_body(body), signature)
 
-    try:
-        handler.handle(body, signature)
-    except InvalidSignatureError:
-        abort(400)
 
-    return "OK"
+def _parse_body(body: str) -> Optional[Dict[str, Any]]:
+    try:
+        body_json = json.loads(body)
+    except ValueError:
+        return None
+    return body_json if isinstance(body_json, dict) else None
 
 
-@handler.add(MessageEvent, message=TextMessageContent)
-def handle_message(event):
-    """テキストメッセージを処理"""
-    chatbot_logic.process_event(event)
+def _channel_webhook(
+    channel: Channel, body: str, body_json: Optional[Dict[str, Any]], signature: str
+):
+    if not channel.validator.validate(body, signature) or body_json is None:
+        abort(400)
+    if webhook_recorder:
+        webhook_recorder.record(body, time.time())
+    # チャネルごとの同時処理数の上限を超えた場合は 429（LINE 側の再送に任せる）
+    if not channel.try_acquire():
+        abort(429)
+    start = time.perf_counter()
+    try:
+        # パース済みの JSON を走査し、フルパイプラインが必要なイベントだけをモデル化する
+        payload = prefilter_parsed(body_json)
+        if shard_pool:
+            # 各コンテキストを担当するワーカーへ送り、処理の完了は待たない
+            shard_pool.dispatch_payload(payload)
+        else:
+            process_payload(channel.logic, payload)
+    finally:
+        channel.release()
+    channel.stats.record(len(payload.items), time.perf_counter() - start)
+    return "OK"
 
 
-@handler.add(JoinEvent)
-def handle_join(event):
-    """グループ/ルーム参加イベントを処理"""
-    chatbot_logic.handle_join(event)
+def process_payload(logic: ChatbotLogic, payload: PrefilteredPayload):
+    """事前フィルタ済みのイベントをこのプロセスで受信順に処理する"""
+    for kind, item in payload.items:
+        with profiler.track_event():
+            if kind == KIND_LIGHT:
+                logic.record_message(item)
+                continue
+            try:
+                event = Event.from_dict(item)
+            except ValueError:
+                continue
+            logic.handle_event(event)
 
 
 if __name__ == "__main__":
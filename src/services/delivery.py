@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from src.utils.metrics import percentile
+
+# 送信経路
+PATH_REPLY = "reply"  # 返信トークンで返信
+PATH_PUSH = "push"  # 返信トークンの期限切れが近いためプッシュ
+PATH_REPLY_FAILED_PUSH = "reply_failed_push"  # 返信が失敗したためプッシュ
+PATHS = (PATH_REPLY, PATH_PUSH, PATH_REPLY_FAILED_PUSH)
+
+# 経路ごとに保持するイベント経過時間のサンプル数
+AGE_WINDOW = 500
+
+
+class DeliveryTracker:
+    """
+    イベントの経過時間（LINE 側のイベント発生時刻から）を見て送信経路を選び、
+    経路ごとの回数と送信時点の経過時間を記録する。
+
+    返信トークンは受信後しばらくすると使えなくなるため、
+    reply_deadline 秒を過ぎたイベントにはプッシュメッセージで送る。
+    """
+
+    def __init__(self, reply_deadline: float = 50.0):
+        self.reply_deadline = reply_deadline
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(PATHS, 0)
+        self._ages: Dict[str, Deque[float]] = {
+            path: deque(maxlen=AGE_WINDOW) for path in PATHS
+        }
+        self._loading = 0
+
+    @staticmethod
+    def event_age(event, now: Optional[float] = None) -> Optional[float]:
+        """イベント発生からの経過秒数（timestamp がない場合は None）"""
+        timestamp = getattr(event, "timestamp", None)
+        if not isinstance(timestamp, int):
+            return None
+        now = time.time() if now is None else now
+        return max(0.0, now - timestamp / 1000)
+
+    def should_push(self, age: Optional[float]) -> bool:
+        return age is not None and age >= self.reply_deadline
+
+    def record(self, path: str, age: Optional[float]):
+        with self._lock:
+            self._counts[path] += 1
+            if age is not None:
+                self._ages[path].append(age)
+
+    def record_loading(self):
+        with self._lock:
+            self._loading += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "reply_deadline_ms": self.reply_deadline * 1e3,
+                "loading_shown": self._loading,
+                "paths": {
+                    path: {
+                        "count": self._counts[path],
+                        "p50_age_ms": percentile(self._ages[path], 0.5) * 1e3,
+                        "p95_age_ms": percentile(self._ages[path], 0.95) * 1e3,
+                    }
+                    for path in PATHS
+                },
+            }
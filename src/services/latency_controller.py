@@ -0,0 +1,108 @@
+import dataclasses
+import threading
+from collections import deque
+from enum import IntEnum
+from typing import Any, Deque, Dict
+
+from src.services.turn_router import Route
+from src.utils.metrics import percentile
+
+
+class DegradationLevel(IntEnum):
+    """負荷時に段階的に省略する処理（値が大きいほど多くを省略）"""
+
+    NORMAL = 0
+    SKIP_SUMMARY = 1  # サマライズを省略
+    NO_WEB_SEARCH = 2  # Web 検索を無効化
+    TIGHT_OUTPUT = 3  # 出力トークン上限を絞る
+    SHORT_HISTORY = 4  # AI 入力に含める履歴を減らす
+
+
+class LatencyController:
+    """
+    ステージごとの直近レイテンシを監視し、全体 (total) の p95 が目標を超えたら
+    劣化レベルを1段階上げ、回復したら1段階戻す。
+
+    レベル変更直後の判定は新しいサンプルが min_samples 件たまるまで保留する。
+    戻す条件は p95 < target * recover_ratio とし、閾値付近での振動を防ぐ。
+    """
+
+    def __init__(
+        self,
+        target_p95: float = 8.0,
+        window: int = 50,
+        min_samples: int = 10,
+        recover_ratio: float = 0.7,
+        tight_output_tokens: int = 200,
+        short_history: int = 3,
+    ):
+        self.target_p95 = target_p95
+        self.window = window
+        self.min_samples = min_samples
+        self.recover_ratio = recover_ratio
+        self.tight_output_tokens = tight_output_tokens
+        self.short_history = short_history
+        self.level = DegradationLevel.NORMAL
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Deque[float]] = {}
+        self._level_changes = 0
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            if stage not in self._stages:
+                self._stages[stage] = deque(maxlen=self.window)
+            self._stages[stage].append(seconds)
+            if stage == "total":
+                self._evaluate_locked()
+
+    def _evaluate_locked(self):
+        samples = self._stages["total"]
+        if len(samples) < self.min_samples:
+            return
+        p95 = percentile(samples, 0.95)
+        if p95 > self.target_p95 and self.level < DegradationLevel.SHORT_HISTORY:
+            self.level = DegradationLevel(self.level + 1)
+        elif p95 < self.target_p95 * self.recover_ratio and self.level > 0:
+            self.level = DegradationLevel(self.level - 1)
+        else:
+            return
+        # 変更前のレベルで計測したサンプルは判定に使わない
+        samples.clear()
+        self._level_changes += 1
+
+    @property
+    def skip_summarization(self) -> bool:
+        return self.level >= DegradationLevel.SKIP_SUMMARY
+
+    def apply(self, route: Route) -> Route:
+        """現在のレベルに応じてルートの Web 検索・出力上限を絞る"""
+        changes: Dict[str, Any] = {}
+        if self.level >= DegradationLevel.NO_WEB_SEARCH and route.web_search:
+            changes["web_search"] = False
+        if self.level >= DegradationLevel.TIGHT_OUTPUT:
+            current = route.max_output_tokens or self.tight_output_tokens
+            changes["max_output_tokens"] = min(current, self.tight_output_tokens)
+        return dataclasses.replace(route, **changes) if changes else route
+
+    def history_limit(self, default: int) -> int:
+        """AI 入力に含める履歴の件数"""
+        if self.level >= DegradationLevel.SHORT_HISTORY:
+            return min(default, self.short_history)
+        return default
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "level": int(self.level),
+                "level_name": self.level.name,
+                "level_changes": self._level_changes,
+                "target_p95_ms": self.target_p95 * 1e3,
+                "stages": {
+                    stage: {
+                        "samples": len(samples),
+                        "p50_ms": percentile(samples, 0.5) * 1e3,
+                        "p95_ms": percentile(samples, 0.95) * 1e3,
+                    }
+                    for stage, samples in self._stages.items()
+                },
+            }
@@ -1,42 +1,109 @@
 from linebot.v3.messaging import (
     ApiClient,
+    ApiException,
     Configuration,
     MarkMessagesAsReadByTokenRequest,
     MessagingApi,
+    PushMessageRequest,
     ReplyMessageRequest,
+    ShowLoadingAnimationRequest,
     TextMessage,
 )
 
+from src.utils.text_splitter import split_text
+
+# 視認性を考慮した1吹き出しあたりの文字数（全角20文字×8行相当）
+SPLIT_LIMIT = 160
+# LINE API の制限: 1リクエストあたりのメッセージ数 / 1メッセージの文字数
+MAX_MESSAGES_PER_REQUEST = 5
+MAX_TEXT_LENGTH = 5000
+# ローディング表示の秒数（5〜60秒。Bot のメッセージが届いた時点で消える）
+LOADING_SECONDS = 60
+
+
+class ReplyTokenError(Exception):
+    """返信トークンが使えなかった（期限切れ・使用済みなど）"""
+
+
+def _is_invalid_reply_token(e: ApiException) -> bool:
+    if e.status != 400 or not e.body:
+        return False
+    body = e.body.decode("utf-8", "replace") if isinstance(e.body, bytes) else e.body
+    return "invalid reply token" in str(body).lower()
+
 
 class LineService:
     def __init__(self, access_token: str):
         self.configuration = Configuration(access_token=access_token)
 
-    def reply_message(self, reply_token: str, text: str):
-        # 300文字を超える場合は分割、最大500文字に制限
+    def reply_message(self, reply_token: str, text: str, push_to: str | None = None):
+        """
+        テキストを分割して返信する。
+        返信1回あたりの上限（5件）を超えた分は、push_to が指定されていれば
+        プッシュメッセージで5件ずつ送信し、なければ最後の吹き出しにまとめる。
+        """
         messages_to_send = self._split_message(text)
+        reply_batch = messages_to_send[:MAX_MESSAGES_PER_REQUEST]
+        overflow = messages_to_send[MAX_MESSAGES_PER_REQUEST:]
+        if overflow and not push_to:
+            merged = "\n".join(reply_batch[-1:] + overflow)
+            reply_batch[-1] = merged[:MAX_TEXT_LENGTH]
+            overflow = []
 
         with ApiClient(self.configuration) as api_client:
             line_bot_api = MessagingApi(api_client)
-            line_bot_api.reply_message_with_http_info(
-                ReplyMessageRequest(
-                    reply_token=reply_token,
-                    messages=[TextMessage(text=m) for m in messages_to_send],
+            try:
+                line_bot_api.reply_message_with_http_info(
+                    ReplyMessageRequest(
+                        reply_token=reply_token,
+                        messages=[TextMessage(text=m) for m in reply_batch],
+                    )
+                )
+            except ApiException as e:
+                # 期限切れ・使用済みの返信トークンは 400 "Invalid reply token" で返る
+                # （この時点では何も送られていない）。他の 400 はそのまま投げる
+                if _is_invalid_reply_token(e):
+                    raise ReplyTokenError(str(e.reason)) from e
+                raise
+            self._push_batches(line_bot_api, push_to, overflow)
+
+    def push_message(self, to: str, text: str):
+        """テキストを分割してプッシュメッセージで送信する（5件ずつ）"""
+        with ApiClient(self.configuration) as api_client:
+            line_bot_api = MessagingApi(api_client)
+            self._push_batches(line_bot_api, to, self._split_message(text))
+
+    def _push_batches(self, line_bot_api: MessagingApi, to: str, chunks: list[str]):
+        for i in range(0, len(chunks), MAX_MESSAGES_PER_REQUEST):
+            batch = chunks[i : i + MAX_MESSAGES_PER_REQUEST]
+            line_bot_api.push_message_with_http_info(
+                PushMessageRequest(
+                    to=to,
+                    messages=[TextMessage(text=m) for m in batch],
                 )
             )
 
+    def show_loading(self, chat_id: str, seconds: int = LOADING_SECONDS) -> bool:
+        """1対1のトークでローディング表示を出す（失敗しても処理は続ける）"""
+        with ApiClient(self.configuration) as api_client:
+            line_bot_api = MessagingApi(api_client)
+            try:
+                line_bot_api.show_loading_animation(
+                    ShowLoadingAnimationRequest(
+                        chat_id=chat_id, loading_seconds=seconds
+                    )
+                )
+                return True
+            except Exception:
+                return False
+
     def _split_message(self, text: str) -> list[str]:
         if not text:
             return [""]
 
-        # 160文字ごとに分割（20文字×8行相当の視認性を考慮）
-        limit = 160
-        chunks = []
-        for i in range(0, len(text), limit):
-            chunk = text[i : i + limit].strip()
-            if chunk:
-                chunks.append(chunk)
-
+        # 160文字ごとを上限に、改行・文末・空白を優先して分割
+        # （絵文字や結合文字、URL の途中では切らない）
+        chunks = split_text(text, SPLIT_LIMIT)
         return chunks if chunks else [""]
 
     def mark_as_read(self, mark_as_read_token: str):
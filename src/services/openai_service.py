@@ -1,33 +1,109 @@
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
 from openai import OpenAI
 
+from src.services.state_journal import StateJournal
+from src.services.turn_router import DEFAULT_MODEL, DEFAULT_ROUTE, Route
+from src.utils.metrics import percentile
+from src.utils.text_splitter import trim_to_sentence_end
+
+JOURNAL_NAME = "openai"
+# 入力トークン数の統計に使うターン数
+USAGE_WINDOW = 500
+# 回答の文字数上限（出力トークン上限がない場合）
+MAX_REPLY_CHARS = 500
+# 出力トークン上限から文字数上限を決める係数（日本語はおおむね1文字1トークン前後）
+CHARS_PER_OUTPUT_TOKEN = 0.8
+
+
+def reply_char_limit(route: Route) -> int:
+    """ルートの出力トークン上限に収まる回答の文字数（10文字単位）"""
+    if not route.max_output_tokens:
+        return MAX_REPLY_CHARS
+    chars = int(route.max_output_tokens * CHARS_PER_OUTPUT_TOKEN) // 10 * 10
+    return max(10, min(MAX_REPLY_CHARS, chars))
+
+
+def _length_instruction(limit: int) -> str:
+    return f"回答は必ず{limit}文字以内で行ってください。"
+
 
 class OpenAIService:
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        journal: Optional[StateJournal] = None,
+        max_chain_turns: int = 40,
+        max_chain_input_tokens: int = 12000,
+    ):
         self.client = OpenAI(api_key=api_key)
         self.previous_responses = {}
+        # レスポンスチェーンのローテーション条件
+        # （ターン数、または直近ターンの入力トークン数が閾値に達したら新しいチェーンへ）
+        self.max_chain_turns = max_chain_turns
+        self.max_chain_input_tokens = max_chain_input_tokens
+        self.chain_turns: Dict[str, int] = {}
+        self.chain_input_tokens: Dict[str, int] = {}
+        self._usage_lock = threading.Lock()
+        self._input_tokens: Deque[int] = deque(maxlen=USAGE_WINDOW)
+        self._rotations = 0
+        self._journal = journal
+        if journal:
+            journal.bind(JOURNAL_NAME, self)
 
-    def get_response(self, context_key: str, user_message: str) -> str:
-        system_message = {
-            "role": "system",
-            "content": "回答は必ず500文字以内で行ってください。",
+    def get_response(
+        self, context_key: str, user_message: str, route: Optional[Route] = None
+    ) -> str:
+        route = route or DEFAULT_ROUTE
+        # 文字数の指示は毎ターン instructions だけで渡す（チェーンに引き継がれないため、
+        # 出力上限を絞ったターンでも有効な上限は常に1つになる）
+        options = {
+            "model": route.model,
+            "instructions": _length_instruction(reply_char_limit(route)),
         }
+        if route.web_search:
+            options["tools"] = [{"type": "web_search"}]
+        if route.max_output_tokens:
+            options["max_output_tokens"] = route.max_output_tokens
         try:
+            if self._should_rotate(context_key):
+                # 新しいチェーンを開始する。ChatbotLogic が組み立てる入力には
+                # 最新のサマリーと直近の会話履歴が含まれるため、それが引き継ぎになる
+                self._drop_chain(context_key)
+                with self._usage_lock:
+                    self._rotations += 1
+
             if context_key not in self.previous_responses:
                 response = self.client.responses.create(
-                    model="gpt-4o-mini",
-                    input=[system_message, {"role": "user", "content": user_message}],
+                    input=[{"role": "user", "content": user_message}],
                     store=True,
-                    tools=[{"type": "web_search"}],
+                    **options,
                 )
             else:
                 response = self.client.responses.create(
-                    model="gpt-4o-mini",
                     input=user_message,
                     previous_response_id=self.previous_responses[context_key],
-                    tools=[{"type": "web_search"}],
+                    **options,
                 )
 
-            self.previous_responses[context_key] = response.id
+            turns = self.chain_turns.get(context_key, 0) + 1
+            input_tokens = self._input_tokens_of(response)
+            self._journaled(
+                "resp",
+                lambda: self._set_chain(context_key, response.id, turns, input_tokens),
+                context_key,
+                response.id,
+                turns,
+                input_tokens,
+            )
+            if input_tokens:
+                with self._usage_lock:
+                    self._input_tokens.append(input_tokens)
+            if getattr(response, "status", None) == "incomplete":
+                # 出力上限で途中まで生成された場合は文の途中で終わらせない
+                return trim_to_sentence_end(response.output_text)
             return response.output_text
 
         except Exception as e:
@@ -43,7 +119,7 @@ class OpenAIService:
         try:
             # Responses API を使用して、これまでの内容の要約を求める
             response = self.client.responses.create(
-                model="gpt-4o-mini",
+                model=DEFAULT_MODEL,
                 input="これまでの会話の内容を、重要なポイントを逃さず100文字程度で簡潔に要約してください。",
                 previous_response_id=self.previous_responses[context_key],
                 store=False,  # サマリー自体はセッション履歴に含めない方が管理しやすい
@@ -53,4 +129,75 @@ class OpenAIService:
             return ""
 
     def clear_session(self, context_key: str):
+        self._journaled("clear", lambda: self._drop_chain(context_key), context_key)
+
+    def _journaled(self, op: str, change: Callable[[], None], *args):
+        """状態を変更し、ジャーナルがあれば同じロックの中で記録する"""
+        if self._journal:
+            self._journal.apply(JOURNAL_NAME, op, change, *args)
+        else:
+            change()
+
+    def usage_stats(self) -> Dict[str, Any]:
+        """ターンあたりの入力トークン数とローテーション回数"""
+        with self._usage_lock:
+            samples = list(self._input_tokens)
+            rotations = self._rotations
+        return {
+            "turns": len(samples),
+            "avg_input_tokens": sum(samples) / len(samples) if samples else 0.0,
+            "p95_input_tokens": percentile(samples, 0.95),
+            "max_input_tokens": max(samples, default=0),
+            "rotations": rotations,
+        }
+
+    def _should_rotate(self, context_key: str) -> bool:
+        if context_key not in self.previous_responses:
+            return False
+        return (
+            self.chain_turns.get(context_key, 0) >= self.max_chain_turns
+            or self.chain_input_tokens.get(context_key, 0)
+            >= self.max_chain_input_tokens
+        )
+
+    def _set_chain(
+        self, context_key: str, response_id: str, turns: int, input_tokens: int
+    ):
+        self.previous_responses[context_key] = response_id
+        self.chain_turns[context_key] = turns
+        self.chain_input_tokens[context_key] = input_tokens
+
+    def _drop_chain(self, context_key: str):
         self.previous_responses.pop(context_key, None)
+        self.chain_turns.pop(context_key, None)
+        self.chain_input_tokens.pop(context_key, None)
+
+    @staticmethod
+    def _input_tokens_of(response) -> int:
+        usage = getattr(response, "usage", None)
+        tokens = getattr(usage, "input_tokens", None)
+        return tokens if isinstance(tokens, int) else 0
+
+    def export_state(self) -> dict:
+        """ジャーナルのスナップショット用に状態を書き出す"""
+        return {
+            "previous_responses": dict(self.previous_responses),
+            "chain_turns": dict(self.chain_turns),
+            "chain_input_tokens": dict(self.chain_input_tokens),
+        }
+
+    def import_state(self, state: dict):
+        """スナップショットから状態を復元する"""
+        self.previous_responses = dict(state["previous_responses"])
+        self.chain_turns = dict(state.get("chain_turns", {}))
+        self.chain_input_tokens = dict(state.get("chain_input_tokens", {}))
+
+    def apply_journal_record(self, op: str, args: list):
+        """ジャーナルの1行を再適用する"""
+        if op == "resp":
+            context_key, response_id, *chain = args
+            self.previous_responses[context_key] = response_id
+            if chain:
+                self._set_chain(context_key, response_id, *chain)
+        elif op == "clear":
+            self._drop_chain(args[0])
@@ -0,0 +1,271 @@
+import gc
+import json
+import os
+import pickle
+import shutil
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Optional, Protocol, TypeVar
+
+T = TypeVar("T")
+
+SNAPSHOT_FILE = "state.snapshot"
+JOURNAL_FILE = "state.journal"
+# 圧縮中に切り離した直前のジャーナル（スナップショット確定後に削除する）
+OLD_JOURNAL_FILE = "state.journal.old"
+
+
+class JournaledState(Protocol):
+    """ジャーナルに状態を記録するオブジェクトが実装するインターフェース"""
+
+    def export_state(self) -> Dict[str, Any]: ...
+
+    def import_state(self, state: Dict[str, Any]) -> None: ...
+
+    def apply_journal_record(self, op: str, args: list) -> None: ...
+
+
+class StateJournal:
+    """
+    ChatbotLogic / OpenAIService のインメモリ状態を追記専用ジャーナルに記録し、
+    再起動時に復元する（ウォームリスタート用のローカル永続化）。
+
+    - 状態変更は `[seq, owner, op, *args]` の JSON 行として追記する。
+    - compact_every 件ごとに全状態をバイナリスナップショット（pickle）へ圧縮する。
+      ロックの中では状態のコピーとジャーナルの切り離し（state.journal.old への
+      リネーム）だけを行い、pickle・fsync・リネームはバックグラウンドで行う。
+      スナップショットが確定したら切り離したジャーナルを削除する。
+    - 起動時はスナップショットを読み込み、切り離したジャーナル、現在の
+      ジャーナルの順に seq がそれより新しい行のみ再適用する。
+    - 状態の変更は apply() で seq の採番と同じロックの中で行う。
+      状態のコピーもこのロックの中で取るため、スナップショットに含まれる変更の
+      ジャーナル行が復元時に再適用されることはない。
+    """
+
+    def __init__(self, directory: str, compact_every: int = 1000, fsync: bool = False):
+        self.directory = directory
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._owners: Dict[str, JournaledState] = {}
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._since_compaction = 0
+        self._file = None
+        self._compacting: Optional[threading.Thread] = None
+
+        # 計測値
+        self._records_written = 0
+        self._write_seconds = 0.0
+        self._restore_seconds = 0.0
+        self._restored_records = 0
+        self._compactions = 0
+        # 圧縮のためにロックを保持した時間（全リクエストが止まる時間）
+        self._last_pause_seconds = 0.0
+        self._max_pause_seconds = 0.0
+
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, SNAPSHOT_FILE)
+
+    @property
+    def journal_path(self) -> str:
+        return os.path.join(self.directory, JOURNAL_FILE)
+
+    @property
+    def old_journal_path(self) -> str:
+        return os.path.join(self.directory, OLD_JOURNAL_FILE)
+
+    def bind(self, name: str, owner: JournaledState):
+        """状態の持ち主を登録する（restore より前に呼ぶこと）"""
+        self._owners[name] = owner
+
+    def apply(self, name: str, op: str, change: Callable[[], T], *args) -> T:
+        """
+        change() で状態を変更し、同じロックの中で1件追記する。
+        change() が例外を投げた場合は追記しない。
+        """
+        start = time.perf_counter()
+        with self._lock:
+            result = change()
+            self._append_locked(name, op, args, start)
+        return result
+
+    def _append_locked(self, name: str, op: str, args: tuple, start: float):
+        self._seq += 1
+        line = json.dumps(
+            [self._seq, name, op, *args], ensure_ascii=False, separators=(",", ":")
+        )
+        f = self._open_journal()
+        f.write(line + "\n")
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+        self._since_compaction += 1
+        self._records_written += 1
+        self._write_seconds += time.perf_counter() - start
+        # 前回の書き出しが終わっていなければ次の追記で改めて試みる
+        if self._since_compaction >= self.compact_every and self._compacting is None:
+            self._start_compaction_locked()
+
+    def compact(self):
+        """現在の全状態をスナップショットに書き出す（書き出しの完了まで待つ）"""
+        while True:
+            with self._lock:
+                pending = self._compacting
+                if pending is None:
+                    thread = self._start_compaction_locked()
+                    break
+            pending.join()
+        thread.join()
+
+    def wait_for_compaction(self):
+        """バックグラウンドの圧縮が終わるまで待つ"""
+        thread = self._compacting
+        if thread:
+            thread.join()
+
+    def restore(self):
+        """スナップショットとジャーナルから状態を復元する"""
+        start = time.perf_counter()
+        with self._lock:
+            snapshot_seq = 0
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "rb") as f:
+                    snapshot = pickle.load(f)
+                snapshot_seq = snapshot["seq"]
+                for name, state in snapshot["owners"].items():
+                    if name in self._owners:
+                        self._owners[name].import_state(state)
+            self._seq = snapshot_seq
+
+            # 圧縮の途中で停止した場合は、切り離したジャーナルが残っている
+            old_exists = os.path.exists(self.old_journal_path)
+            if old_exists:
+                self._replay_journal_locked(self.old_journal_path, snapshot_seq)
+            if os.path.exists(self.journal_path):
+                self._replay_journal_locked(self.journal_path, snapshot_seq)
+            if old_exists:
+                # 切り離したジャーナルを取り込んだスナップショットを書いてから削除する
+                self._write_snapshot(self._export_locked())
+                os.remove(self.old_journal_path)
+                self._file = open(self.journal_path, "w", encoding="utf-8")
+                self._since_compaction = 0
+        self._restore_seconds = time.perf_counter() - start
+
+    def close(self):
+        self.wait_for_compaction()
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        written = self._records_written
+        return {
+            "records_written": written,
+            "avg_write_us": (self._write_seconds / written * 1e6) if written else 0.0,
+            "compactions": self._compactions,
+            "last_compaction_pause_ms": self._last_pause_seconds * 1e3,
+            "max_compaction_pause_ms": self._max_pause_seconds * 1e3,
+            "restore_seconds": self._restore_seconds,
+            "restored_records": self._restored_records,
+        }
+
+    def _replay_journal_locked(self, path: str, snapshot_seq: int):
+        valid_end = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    seq, name, op, *args = json.loads(line)
+                except ValueError:
+                    break  # 書き込み途中で停止した末尾行
+                valid_end += len(line)
+                if seq <= snapshot_seq or name not in self._owners:
+                    continue
+                self._owners[name].apply_journal_record(op, args)
+                self._seq = seq
+                self._since_compaction += 1
+                self._restored_records += 1
+
+        # 壊れた末尾行の後ろに追記しないよう切り詰める
+        if valid_end < os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(valid_end)
+
+    def _open_journal(self):
+        if self._file is None:
+            self._file = open(self.journal_path, "a", encoding="utf-8")
+        return self._file
+
+    def _export_locked(self) -> Dict[str, Any]:
+        # 大量のコンテナを複製する間に世代別 GC が走ると数倍遅くなり、
+        # その間すべての状態変更がロック待ちになるため、コピー中は止める
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            owners = {name: o.export_state() for name, o in self._owners.items()}
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return {"seq": self._seq, "owners": owners}
+
+    def _rotate_locked(self):
+        """現在のジャーナルを切り離し、以降の追記を新しいジャーナルに向ける"""
+        if self._file:
+            self._file.close()
+            self._file = None
+        if not os.path.exists(self.journal_path):
+            return
+        if os.path.exists(self.old_journal_path):
+            # 前回の書き出しが失敗して残っている場合は後ろに連結する（seq は昇順のまま）
+            with (
+                open(self.old_journal_path, "ab") as dst,
+                open(self.journal_path, "rb") as src,
+            ):
+                shutil.copyfileobj(src, dst)
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, self.old_journal_path)
+
+    def _start_compaction_locked(self) -> threading.Thread:
+        start = time.perf_counter()
+        snapshot = self._export_locked()
+        self._rotate_locked()
+        self._since_compaction = 0
+        thread = threading.Thread(
+            target=self._compact_in_background, args=(snapshot,), daemon=True
+        )
+        self._compacting = thread
+        thread.start()
+        pause = time.perf_counter() - start
+        self._last_pause_seconds = pause
+        self._max_pause_seconds = max(self._max_pause_seconds, pause)
+        return thread
+
+    def _compact_in_background(self, snapshot: Dict[str, Any]):
+        try:
+            self._write_snapshot(snapshot)
+            # スナップショット確定後に切り離したジャーナルを削除する
+            # （ここで停止しても seq により重複適用は起きない）
+            if os.path.exists(self.old_journal_path):
+                os.remove(self.old_journal_path)
+            with self._lock:
+                self._compactions += 1
+        except OSError:
+            # 切り離したジャーナルは残るため、次の圧縮・復元で取り込まれる
+            traceback.print_exc(file=sys.stderr)
+        finally:
+            with self._lock:
+                self._compacting = None
+
+    def _write_snapshot(self, snapshot: Dict[str, Any]):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
@@ -0,0 +1,154 @@
+import json
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+from src.utils.metrics import percentile
+
+DEFAULT_MODEL = "gpt-4o-mini"
+# ルートごとに保持するレイテンシのサンプル数
+LATENCY_WINDOW = 200
+
+
+@dataclass(frozen=True)
+class Route:
+    """1ターンの応答に使うモデル・ツール・出力上限"""
+
+    name: str
+    model: str = DEFAULT_MODEL
+    web_search: bool = True
+    max_output_tokens: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class RoutingRule:
+    """pattern に一致し、かつ max_chars 以下の入力を route に割り当てる"""
+
+    route: Route
+    pattern: Optional[re.Pattern] = None
+    max_chars: Optional[int] = None
+
+    def matches(self, text: str) -> bool:
+        if self.max_chars is not None and len(text) > self.max_chars:
+            return False
+        if self.pattern is not None and not self.pattern.search(text):
+            return False
+        return True
+
+
+# 一致するルールがない入力は Web 検索なし（web_search ツールを渡すと、
+# 使うかどうかの判断だけでも毎ターン入力・レイテンシが増えるため）
+DEFAULT_ROUTE = Route("default", web_search=False)
+
+# 挨拶・相づちの語。"www" などの繰り返しは1文字ずつ一致させ、
+# 同じ文字列を複数通りに分割できる（バックトラックが指数的に増える）形にしない
+_SMALL_TALK_TOKEN = (
+    r"(?:こんにちは|こんばんは|おはよう(?:ございます)?|おやすみ|"
+    r"ありがとう(?:ございます)?|よろしく(?:お願いします)?|はじめまして|"
+    r"了解|りょうかい|おけ|ok|hi|hello|hey|thanks?|笑|草|w|"
+    r"すごい|なるほど|そうなんだ|いいね|やあ|どうも)"
+)
+_SMALL_TALK_PUNCT = r"[!！?？。、.〜ー～♪\s]"
+
+DEFAULT_RULES: List[RoutingRule] = [
+    # 挨拶・相づちだけの短い雑談は Web 検索なし・短い出力
+    RoutingRule(
+        route=Route("small_talk", web_search=False, max_output_tokens=200),
+        pattern=re.compile(
+            rf"^{_SMALL_TALK_TOKEN}(?:{_SMALL_TALK_PUNCT}|{_SMALL_TALK_TOKEN})*$",
+            re.IGNORECASE,
+        ),
+        max_chars=30,
+    ),
+    # 最新情報が必要そうな質問だけ Web 検索を有効にする
+    RoutingRule(
+        route=Route("search", web_search=True),
+        pattern=re.compile(
+            r"最新|ニュース|今日|明日|昨日|今週|来週|先週|今月|今年|現在|最近|"
+            r"天気|株価|価格|値段|いくら|営業時間|発売|"
+            r"調べ|検索|速報|結果|ランキング|https?://",
+            re.IGNORECASE,
+        ),
+    ),
+]
+
+
+class TurnRouter:
+    """
+    入力テキストをローカルのルールだけで分類し、ルートを決める。
+    ルールは先頭から評価し、最初に一致したものを使う。
+    """
+
+    def __init__(
+        self,
+        rules: Optional[List[RoutingRule]] = None,
+        default: Route = DEFAULT_ROUTE,
+    ):
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.default = default
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    @classmethod
+    def from_file(cls, path: str) -> "TurnRouter":
+        """
+        JSON ファイルからルールを読み込む。
+
+        {"default": {"model": "gpt-4o-mini", "web_search": true},
+         "rules": [{"name": "small_talk", "pattern": "^(hi|hello)",
+                    "max_chars": 30, "web_search": false,
+                    "max_output_tokens": 200}]}
+        """
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        rules = [
+            RoutingRule(
+                route=_route_from_dict(r),
+                pattern=re.compile(r["pattern"], re.IGNORECASE)
+                if r.get("pattern")
+                else None,
+                max_chars=r.get("max_chars"),
+            )
+            for r in data.get("rules", [])
+        ]
+        default = _route_from_dict({"name": "default", **data.get("default", {})})
+        return cls(rules, default)
+
+    def classify(self, text: str) -> Route:
+        text = text.strip()
+        for rule in self.rules:
+            if rule.matches(text):
+                return rule.route
+        return self.default
+
+    def record(self, route: Route, seconds: float):
+        """ルートごとの決定回数と応答レイテンシを記録する"""
+        with self._lock:
+            self._counts[route.name] = self._counts.get(route.name, 0) + 1
+            if route.name not in self._latencies:
+                self._latencies[route.name] = deque(maxlen=LATENCY_WINDOW)
+            self._latencies[route.name].append(seconds)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for name, count in self._counts.items():
+                samples = self._latencies[name]
+                result[name] = {
+                    "count": count,
+                    "avg_ms": sum(samples) / len(samples) * 1e3,
+                    "p95_ms": percentile(samples, 0.95) * 1e3,
+                }
+            return result
+
+
+def _route_from_dict(data: Dict[str, Any]) -> Route:
+    return Route(
+        name=data["name"],
+        model=data.get("model", DEFAULT_MODEL),
+        web_search=data.get("web_search", True),
+        max_output_tokens=data.get("max_output_tokens"),
+    )
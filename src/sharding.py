@@ -0,0 +1,336 @@
+"""
+コンテキスト単位のシャーディング（マルチプロセス）
+
+フロントプロセスは署名検証と事前フィルタだけを行い、各イベントを context_key の
+コンシステントハッシュで固定のワーカープロセスへ送る。ワーカーはそのシャードに
+属するコンテキストの状態（履歴・レスポンスチェーン）をすべてローカルに持つ。
+"""
+
+import bisect
+import hashlib
+import multiprocessing
+import os
+import queue as queue_module
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Iterable, List, Optional
+
+from linebot.v3.webhooks import Event
+
+from src.bootstrap import build_services
+from src.logic import ChatbotLogic
+from src.utils.webhook_prefilter import (
+    KIND_EVENT,
+    KIND_LIGHT,
+    LightMessage,
+    PrefilteredPayload,
+    context_key_from_source,
+)
+
+# リング上の仮想ノード数（多いほど負荷が均等になる）
+DEFAULT_VNODES = 64
+
+
+def _hash(label: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(label.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+class HashRing:
+    """
+    コンシステントハッシュリング。
+    ノードを外しても、そのノードが持っていたキーだけが他のノードへ移る。
+    """
+
+    def __init__(self, nodes: Iterable[Hashable] = (), vnodes: int = DEFAULT_VNODES):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: Dict[int, Hashable] = {}
+        self._nodes: List[Hashable] = []
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[Hashable]:
+        return list(self._nodes)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def add(self, node: Hashable):
+        if node in self._nodes:
+            return
+        self._nodes.append(node)
+        for i in range(self.vnodes):
+            point = _hash(f"{node}#{i}")
+            self._owners[point] = node
+            bisect.insort(self._points, point)
+
+    def remove(self, node: Hashable):
+        if node not in self._nodes:
+            return
+        self._nodes.remove(node)
+        self._points = [p for p in self._points if self._owners[p] != node]
+        self._owners = {p: self._owners[p] for p in self._points}
+
+    def node_for(self, key: str) -> Hashable:
+        if not self._points:
+            raise LookupError("hash ring has no nodes")
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[self._points[index]]
+
+
+class KeyedExecutor:
+    """
+    スレッドプール上でタスクを実行する。異なるキーのタスクは並列に、
+    同じキーのタスクは投入順に1つずつ実行する（同一会話の順序を保つ）。
+    """
+
+    def __init__(self, max_workers: int = 8):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, Deque[tuple]] = {}
+
+    def submit(self, key: Hashable, fn: Callable, *args):
+        task = (fn, args)
+        with self._lock:
+            if key in self._pending:
+                self._pending[key].append(task)
+                return
+            self._pending[key] = deque([task])
+        self._pool.submit(self._drain, key)
+
+    def _drain(self, key: Hashable):
+        while True:
+            with self._lock:
+                tasks = self._pending[key]
+                if not tasks:
+                    del self._pending[key]
+                    return
+                fn, args = tasks.popleft()
+            try:
+                fn(*args)
+            except Exception:
+                # 1件の失敗で同じキーの後続タスクを止めない
+                traceback.print_exc()
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+def build_shard_logic(shard_id: int, journal_dir: str):
+    """ワーカー用に main.py と同じ構成のサービスを組み立てる"""
+    # Config は import 時に環境変数を読むため、ワーカー内で初めて読み込む
+    from src.config import config
+
+    services = build_services(
+        config, os.path.join(journal_dir, f"shard-{shard_id}") if journal_dir else ""
+    )
+    if services.journal:
+        services.journal.restore()
+    return services.logic, services.journal
+
+
+def _handle_item(logic: ChatbotLogic, kind: str, payload: Any):
+    if kind == KIND_LIGHT:
+        logic.record_message(payload)
+        return
+    try:
+        event = Event.from_dict(payload)
+    except ValueError:
+        return
+    logic.handle_event(event)
+
+
+def run_worker(shard_id: int, queue, journal_dir: str, threads: int):
+    """
+    ワーカープロセスの本体。キューから (kind, context_key, payload) を受け取り、
+    None を受け取ったら処理中のタスクを終えてから終了する。
+    """
+    logic, journal = build_shard_logic(shard_id, journal_dir)
+    executor = KeyedExecutor(threads)
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+        kind, context_key, payload = item
+        executor.submit(context_key, _handle_item, logic, kind, payload)
+    executor.shutdown()
+    if journal:
+        journal.close()
+
+
+class ShardPool:
+    """
+    シャードごとに1つのワーカープロセスとキューを持ち、context_key で振り分ける。
+
+    - 落ちたワーカーは同じシャード番号・同じキューで再起動する。
+      シャードの割り当ては変わらず、ジャーナルがあれば状態も復元される。
+    - 直近 restart_window 秒に max_restarts 回落ちたシャードはリングから外し、
+      未処理のキューを新しい担当シャードへ振り直す（最後の1つは外さない）。
+      新しい担当は外したシャードのジャーナルを読まないため、
+      移ったコンテキストの履歴・レスポンスチェーンは引き継がれない。
+    - 落ちたワーカーがキューから取り出し済みで処理中だったイベントは失われる
+      （フロントは受信時点で LINE に 200 を返しているため、LINE からの再送もない）。
+    """
+
+    def __init__(
+        self,
+        num_workers: int,
+        journal_dir: str = "",
+        threads: int = 8,
+        worker_target: Callable = run_worker,
+        max_restarts: int = 5,
+        restart_window: float = 300.0,
+        check_interval: float = 1.0,
+    ):
+        if num_workers <= 0:
+            raise ValueError("num_workers must be positive")
+        self.journal_dir = journal_dir
+        self.threads = threads
+        self.worker_target = worker_target
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.check_interval = check_interval
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.ring = HashRing(range(num_workers))
+        self._queues = {shard: self._ctx.Queue() for shard in range(num_workers)}
+        self._processes: Dict[int, Any] = {}
+        self._restarts = dict.fromkeys(range(num_workers), 0)
+        self._recent_restarts: Dict[int, Deque[float]] = {
+            shard: deque() for shard in range(num_workers)
+        }
+        self._dispatched = dict.fromkeys(range(num_workers), 0)
+        self._rebalanced = 0
+        for shard in range(num_workers):
+            self._start(shard)
+        self._supervisor = threading.Thread(
+            target=self._supervise, name="shard-supervisor", daemon=True
+        )
+        self._supervisor.start()
+
+    def _start(self, shard: int):
+        process = self._ctx.Process(
+            target=self.worker_target,
+            args=(shard, self._queues[shard], self.journal_dir, self.threads),
+            name=f"shard-{shard}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[shard] = process
+
+    def dispatch_payload(self, payload: PrefilteredPayload):
+        """受信順に各コンテキストの担当へ送る（同じコンテキストの順序は保たれる）"""
+        for kind, item in payload.items:
+            if kind == KIND_LIGHT:
+                self.dispatch_light(item)
+            else:
+                self.dispatch_event(item)
+
+    def dispatch_light(self, message: LightMessage):
+        self._put((KIND_LIGHT, message.context_key, message))
+
+    def dispatch_event(self, event_dict: Dict[str, Any]):
+        context_key = context_key_from_source(event_dict.get("source") or {})
+        self._put((KIND_EVENT, context_key, event_dict))
+
+    def _put(self, item: tuple):
+        with self._lock:
+            shard = self.ring.node_for(item[1])
+            self._dispatched[shard] += 1
+            self._queues[shard].put(item)
+
+    def _supervise(self):
+        while not self._stopped.wait(self.check_interval):
+            self.check_workers()
+
+    def check_workers(self):
+        """落ちたワーカーを再起動、または担当から外す"""
+        with self._lock:
+            if self._stopped.is_set():
+                return
+            for shard, process in list(self._processes.items()):
+                if process.is_alive():
+                    continue
+                process.join()
+                print(
+                    f"shard-{shard} exited with code {process.exitcode}; "
+                    "events it was processing were dropped",
+                    file=sys.stderr,
+                )
+                now = time.monotonic()
+                recent = self._recent_restarts[shard]
+                # 再起動の回数は直近 restart_window 秒の分だけ数える
+                while recent and now - recent[0] > self.restart_window:
+                    recent.popleft()
+                if len(recent) < self.max_restarts or len(self.ring) == 1:
+                    recent.append(now)
+                    self._restarts[shard] += 1
+                    self._start(shard)
+                else:
+                    self._retire_locked(shard)
+
+    def _retire_locked(self, shard: int):
+        print(
+            f"shard-{shard} retired after {self.max_restarts} restarts in "
+            f"{self.restart_window:.0f}s; its contexts move to other shards "
+            "without their history",
+            file=sys.stderr,
+        )
+        self.ring.remove(shard)
+        del self._processes[shard]
+        backlog = self._queues.pop(shard)
+        while True:
+            try:
+                item = backlog.get_nowait()
+            except queue_module.Empty:
+                break
+            if item is None:
+                continue
+            new_shard = self.ring.node_for(item[1])
+            self._dispatched[new_shard] += 1
+            self._queues[new_shard].put(item)
+            self._rebalanced += 1
+
+    def stop(self, timeout: float = 10.0):
+        """ワーカーへ終了を通知し、処理中のタスクが終わるのを待つ"""
+        with self._lock:
+            self._stopped.set()
+            processes = dict(self._processes)
+            for shard in processes:
+                self._queues[shard].put(None)
+        self._supervisor.join()
+        for process in processes.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            shards = {}
+            for shard, process in self._processes.items():
+                try:
+                    backlog: Optional[int] = self._queues[shard].qsize()
+                except NotImplementedError:  # macOS
+                    backlog = None
+                shards[str(shard)] = {
+                    "alive": process.is_alive(),
+                    "pid": process.pid,
+                    "restarts": self._restarts[shard],
+                    "dispatched": self._dispatched[shard],
+                    "backlog": backlog,
+                }
+            return {
+                "workers": len(self._processes),
+                "retired": sorted(set(self._restarts) - set(self._processes)),
+                "rebalanced": self._rebalanced,
+                "shards": shards,
+            }
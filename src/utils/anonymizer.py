@@ -1,5 +1,9 @@
+import hashlib
 import re
 
+# LINEのIDパターン (User: U..., Group: G..., Room: C...)
+LINE_ID_PATTERN = re.compile(r"(U[0-9a-f]{32}|G[0-9a-f]{32}|C[0-9a-f]{32})")
+
 
 def anonymize_text(text: str) -> str:
     """
@@ -9,10 +13,35 @@ def anonymize_text(text: str) -> str:
     if not text:
         return text
 
-    # LINEのIDパターン (User: U..., Group: G..., Room: C...)
-    line_id_pattern = r"(U[0-9a-f]{32}|G[0-9a-f]{32}|C[0-9a-f]{32})"
-
     # 匿名化処理
-    anonymized_text = re.sub(line_id_pattern, "[ID]", text)
+    anonymized_text = LINE_ID_PATTERN.sub("[ID]", text)
 
     return anonymized_text
+
+
+def pseudonymize_ids(text: str, salt: str) -> str:
+    """
+    LINE ID を同じ形式の仮名IDに置換する。
+    同じ salt なら同じ ID は同じ仮名になるため、会話のまとまりは保たれる。
+    """
+    if not text:
+        return text
+
+    def _replace(match: re.Match) -> str:
+        line_id = match.group(0)
+        digest = hashlib.sha256((salt + line_id).encode("utf-8")).hexdigest()
+        return line_id[0] + digest[:32]
+
+    return LINE_ID_PATTERN.sub(_replace, text)
+
+
+def mask_text(text: str) -> str:
+    """
+    メッセージ本文を文字数を保ったまま伏せ字にする（メンション位置を崩さないため）。
+    英数字は "x"、それ以外の文字は "あ" に置換し、空白・記号・絵文字は残す。
+    """
+    if not text:
+        return text
+    return "".join(
+        ("x" if ch.isascii() else "あ") if ch.isalnum() else ch for ch in text
+    )
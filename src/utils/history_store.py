@@ -0,0 +1,134 @@
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+HISTORY_SIZE = 10
+SUMMARY_SIZE = 10
+
+
+class ContextState:
+    """
+    1コンテキスト分の状態（会話履歴・受信累計・サマリー）。
+
+    履歴は [speaker0, text0, speaker1, text1, ...] のフラットなリストを
+    リングバッファとして使い、deque やタプルを生成しない。
+    """
+
+    __slots__ = ("_ring", "_head", "message_count", "summaries")
+
+    def __init__(self):
+        self._ring: List[str] = []
+        self._head = 0  # 満杯時に次に上書きする位置（エントリ単位）
+        self.message_count = 0
+        self.summaries: Optional[List[str]] = None
+
+    def append(self, speaker: str, text: str, capacity: int = HISTORY_SIZE):
+        if len(self._ring) < capacity * 2:
+            self._ring.append(speaker)
+            self._ring.append(text)
+            return
+        pos = self._head * 2
+        self._ring[pos] = speaker
+        self._ring[pos + 1] = text
+        self._head = (self._head + 1) % capacity
+
+    def entries(self) -> List[Tuple[str, str]]:
+        """古い順の (user_id, text) リスト"""
+        return _ordered_entries(self._ring, self._head)
+
+    def export(self) -> tuple:
+        """スナップショット用のコピー（リングバッファをそのまま複製する）"""
+        summaries = list(self.summaries) if self.summaries else []
+        return (self._ring[:], self._head, self.message_count, summaries)
+
+    def add_summary(self, summary: str, capacity: int = SUMMARY_SIZE):
+        if self.summaries is None:
+            self.summaries = []
+        self.summaries.append(summary)
+        if len(self.summaries) > capacity:
+            del self.summaries[0]
+
+
+def _ordered_entries(ring: List[str], head: int) -> List[Tuple[str, str]]:
+    pos = head * 2
+    ordered = ring[pos:] + ring[:pos]
+    return list(zip(ordered[::2], ordered[1::2], strict=True))
+
+
+class HistoryStore:
+    """
+    コンテキストごとの ContextState を1つの辞書で管理する。
+    発言者のユーザーIDは intern し、メッセージごとに同じ文字列を複製しない。
+    """
+
+    def __init__(
+        self, history_size: int = HISTORY_SIZE, summary_size: int = SUMMARY_SIZE
+    ):
+        self.history_size = history_size
+        self.summary_size = summary_size
+        self._contexts: Dict[str, ContextState] = {}
+
+    def __len__(self) -> int:
+        return len(self._contexts)
+
+    def __contains__(self, context_key: str) -> bool:
+        return context_key in self._contexts
+
+    def items(self) -> Iterator[Tuple[str, ContextState]]:
+        return iter(self._contexts.items())
+
+    def get(self, context_key: str) -> Optional[ContextState]:
+        return self._contexts.get(context_key)
+
+    def append(self, context_key: str, user_id: str, text: str) -> int:
+        """履歴に追加し、受信累計を返す"""
+        state = self._contexts.get(context_key)
+        if state is None:
+            state = self._contexts[context_key] = ContextState()
+        state.append(sys.intern(user_id), text, self.history_size)
+        state.message_count += 1
+        return state.message_count
+
+    def history(self, context_key: str) -> List[Tuple[str, str]]:
+        state = self._contexts.get(context_key)
+        return state.entries() if state else []
+
+    def summaries(self, context_key: str) -> List[str]:
+        state = self._contexts.get(context_key)
+        return list(state.summaries) if state and state.summaries else []
+
+    def message_count(self, context_key: str) -> int:
+        state = self._contexts.get(context_key)
+        return state.message_count if state else 0
+
+    def add_summary(self, context_key: str, summary: str):
+        state = self._contexts.get(context_key)
+        if state is None:
+            state = self._contexts[context_key] = ContextState()
+        state.add_summary(summary, self.summary_size)
+
+    def reset(self, context_key: str):
+        """受信累計とサマリーをリセットする（履歴は残す）"""
+        state = self._contexts.get(context_key)
+        if state:
+            state.message_count = 0
+            state.summaries = None
+
+    def export_state(self) -> Dict[str, tuple]:
+        # ジャーナルのロック内で呼ばれるため、並べ替えは import 側で行う
+        return {key: state.export() for key, state in self._contexts.items()}
+
+    def import_state(self, contexts: Dict[str, tuple]):
+        self._contexts = {}
+        for key, saved in contexts.items():
+            if len(saved) == 4:
+                ring, head, count, summaries = saved
+                entries = _ordered_entries(ring, head)
+            else:
+                # 旧形式（古い順の (user_id, text) リスト）
+                entries, count, summaries = saved
+            state = self._contexts[key] = ContextState()
+            for user_id, text in entries:
+                state.append(sys.intern(user_id), text, self.history_size)
+            state.message_count = count
+            for summary in summaries:
+                state.add_summary(summary, self.summary_size)
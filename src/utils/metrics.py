@@ -0,0 +1,9 @@
+from typing import Iterable
+
+
+def percentile(samples: Iterable[float], q: float) -> float:
+    """サンプルの q 分位点（0 <= q <= 1, nearest-rank）。空の場合は 0.0"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
@@ -0,0 +1,277 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+MODE_CPU = "cpu"
+MODE_ALLOC = "alloc"
+MODES = (MODE_CPU, MODE_ALLOC)
+
+# サンプリング間隔（秒）
+DEFAULT_INTERVAL = 0.005
+# アロケーション集計で表示する件数・保持するトレースバックの深さ
+TOP_ALLOCATIONS = 25
+TRACEBACK_DEPTH = 16
+# イベント単位のアロケーション集計で対象にするコード（src/ 配下のいずれかのフレームを
+# 経由した確保のみ。無関係なスレッドの確保を除く）
+EVENT_PATH_PATTERN = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "*"
+)
+
+
+class ProfilerBusyError(Exception):
+    """別のプロファイルが実行中"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+class SamplingProfiler:
+    """
+    別スレッドから sys._current_frames() を一定間隔で読み、
+    スタックを collapsed 形式（flamegraph.pl / speedscope で読める）で集計する。
+    thread_ids を渡した場合は、その集合に含まれるスレッドだけをサンプリングする。
+    """
+
+    def __init__(
+        self,
+        interval: float = DEFAULT_INTERVAL,
+        thread_ids: Optional[Set[int]] = None,
+    ):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            targets = self.thread_ids
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if targets is not None and thread_id not in targets:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.samples.most_common()
+        )
+
+
+def _filter_snapshot(
+    snapshot: tracemalloc.Snapshot, event_path: bool = False
+) -> tracemalloc.Snapshot:
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ]
+    if event_path:
+        filters.append(tracemalloc.Filter(True, EVENT_PATH_PATTERN, all_frames=True))
+    return snapshot.filter_traces(filters)
+
+
+def _allocation_report(sites: Dict[str, Tuple[int, int]], header: str) -> str:
+    """sites: "ファイル:行" -> (バイト数, ブロック数)"""
+    ranked = sorted(sites.items(), key=lambda item: item[1][0], reverse=True)
+    total = sum(size for size, _ in sites.values())
+    lines = [f"# total {total} bytes in {len(sites)} sites ({header})"]
+    for site, (size, count) in ranked[:TOP_ALLOCATIONS]:
+        lines.append(f"{size:>10} B {count:>7} blocks  {site}")
+    return "\n".join(lines) + "\n"
+
+
+def _snapshot_sites(snapshot: tracemalloc.Snapshot) -> Dict[str, Tuple[int, int]]:
+    sites = {}
+    for stat in _filter_snapshot(snapshot).statistics("lineno"):
+        frame = stat.traceback[0]
+        sites[f"{frame.filename}:{frame.lineno}"] = (stat.size, stat.count)
+    return sites
+
+
+class ProfilerManager:
+    """
+    デバッグエンドポイントから使うプロファイラの管理（同時に1つまで）。
+
+    - run_for(): 指定秒数だけプロファイルし、結果を返す
+    - arm(): 次の N 件の Webhook イベント処理だけをプロファイルする。
+      Webhook 側は track_event() でイベント処理を囲む。結果は result() で取得する。
+      timeout 秒以内に N 件に達しない場合は、それまでの結果で打ち切る。
+
+    mode=alloc はいずれも「確保したまま残ったメモリ（純増）」の上位を出す。
+    途中で解放された一時的な確保は含まれない（イベント中のピークはヘッダに出す）。
+    - arm(): イベントの開始時と終了時のスナップショットの差分を、src/ 配下の
+      フレームを経由した確保に絞って合計する。同時に処理中の別イベントの確保は
+      差分に混ざりうる。
+    - run_for(): 開始から終了までにプロセス全体で増えたメモリ。
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._mode: Optional[str] = None
+        self._remaining_events = 0
+        self._event_threads: Set[int] = set()
+        self._sampler: Optional[SamplingProfiler] = None
+        self._result: Optional[str] = None
+        self._session = 0
+        # mode=alloc の arm() 中に集計する "ファイル:行" -> [バイト数, ブロック数]
+        self._alloc_sites: Dict[str, list] = {}
+        self._alloc_events = 0
+        self._alloc_peak = 0
+        self._per_event = False
+
+    @property
+    def running(self) -> bool:
+        return self._mode is not None
+
+    def run_for(self, seconds: float, mode: str = MODE_CPU) -> str:
+        with self._lock:
+            self._begin(mode, thread_ids=None)
+        time.sleep(seconds)
+        with self._lock:
+            self._result = self._finish()
+            return self._result
+
+    def arm(self, events: int, mode: str = MODE_CPU, timeout: Optional[float] = None):
+        with self._lock:
+            event_threads: Set[int] = set()
+            self._begin(mode, thread_ids=event_threads)
+            self._event_threads = event_threads
+            self._remaining_events = events
+            self._result = None
+            session = self._session
+        if timeout is not None:
+            timer = threading.Timer(timeout, self._expire, args=(session,))
+            timer.daemon = True
+            timer.start()
+
+    def _expire(self, session: int):
+        """arm() の期限切れ（同じセッションが続いていれば打ち切る）"""
+        with self._lock:
+            if self._session == session and self._remaining_events:
+                self._result = self._finish()
+
+    def result(self) -> Optional[str]:
+        """直近の結果（未完了・未実行の場合は None）"""
+        with self._lock:
+            return None if self.running else self._result
+
+    @contextmanager
+    def track_event(self) -> Iterator[None]:
+        """Webhook イベント処理を囲み、arm() 中であれば計測対象にする"""
+        if not self._remaining_events:
+            yield
+            return
+        thread_id = threading.get_ident()
+        self._event_threads.add(thread_id)
+        before = self._take_snapshot() if self._mode == MODE_ALLOC else None
+        try:
+            yield
+        finally:
+            self._event_threads.discard(thread_id)
+            if before is not None:
+                self._record_allocations(before)
+            with self._lock:
+                if self._remaining_events:
+                    self._remaining_events -= 1
+                    if not self._remaining_events:
+                        self._result = self._finish()
+
+    @staticmethod
+    def _take_snapshot() -> Optional[tracemalloc.Snapshot]:
+        # 別スレッドで計測が終わり tracemalloc が止まっている場合がある
+        try:
+            return tracemalloc.take_snapshot()
+        except RuntimeError:
+            return None
+
+    def _record_allocations(self, before: tracemalloc.Snapshot):
+        after = self._take_snapshot()
+        if after is None:
+            return
+        _, peak = tracemalloc.get_traced_memory()
+        diff = _filter_snapshot(after, event_path=True).compare_to(
+            _filter_snapshot(before, event_path=True), "lineno"
+        )
+        with self._lock:
+            if self._mode != MODE_ALLOC:
+                return
+            self._alloc_events += 1
+            self._alloc_peak = max(self._alloc_peak, peak)
+            for stat in diff:
+                if stat.size_diff <= 0:
+                    continue
+                frame = stat.traceback[0]
+                site = self._alloc_sites.setdefault(
+                    f"{frame.filename}:{frame.lineno}", [0, 0]
+                )
+                site[0] += stat.size_diff
+                site[1] += max(stat.count_diff, 0)
+
+    def _begin(self, mode: str, thread_ids: Optional[Set[int]]):
+        if mode not in MODES:
+            raise ValueError(f"unknown profile mode: {mode}")
+        if self.running:
+            raise ProfilerBusyError()
+        self._mode = mode
+        self._per_event = thread_ids is not None
+        if mode == MODE_CPU:
+            self._sampler = SamplingProfiler(self.interval, thread_ids)
+            self._sampler.start()
+        else:
+            self._alloc_sites = {}
+            self._alloc_events = 0
+            self._alloc_peak = 0
+            tracemalloc.start(TRACEBACK_DEPTH)
+
+    def _finish(self) -> str:
+        if self._mode == MODE_CPU:
+            self._sampler.stop()
+            result = self._sampler.collapsed()
+            self._sampler = None
+        elif self._per_event:
+            tracemalloc.stop()
+            sites = {site: tuple(v) for site, v in self._alloc_sites.items()}
+            result = _allocation_report(
+                sites,
+                f"net growth over {self._alloc_events} events, "
+                f"peak traced {self._alloc_peak} bytes",
+            )
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            result = _allocation_report(
+                _snapshot_sites(snapshot), f"net growth, peak traced {peak} bytes"
+            )
+        self._mode = None
+        self._remaining_events = 0
+        self._session += 1
+        return result
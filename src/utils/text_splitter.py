@@ -0,0 +1,144 @@
+import re
+import unicodedata
+from typing import List
+
+# URL の途中では分割しない
+_URL_PATTERN = re.compile(r"https?://[^\s<>\"'「」（）。、]+")
+
+# 直前の文字と結合して1つの書記素クラスタになる文字
+_ZWJ = "\u200d"
+_KEYCAP = "\u20e3"
+
+# 分割位置の優先度（値が大きいほど優先）
+_BREAK_LINE = 3
+_BREAK_SENTENCE = 2
+_BREAK_SPACE = 1
+_SENTENCE_ENDS = frozenset("。！？!?．")
+_SOFT_BREAKS = frozenset("、，,")
+
+
+def _is_regional_indicator(ch: str) -> bool:
+    return 0x1F1E6 <= ord(ch) <= 0x1F1FF
+
+
+def _extends_cluster(ch: str) -> bool:
+    cp = ord(ch)
+    return (
+        ch == _ZWJ
+        or ch == _KEYCAP
+        or 0xFE00 <= cp <= 0xFE0F  # 異体字セレクタ
+        or 0xE0100 <= cp <= 0xE01EF
+        or 0x1F3FB <= cp <= 0x1F3FF  # 肌の色の修飾子
+        or 0xE0020 <= cp <= 0xE007F  # タグ文字（地域旗）
+        or unicodedata.category(ch) in ("Mn", "Me", "Mc")  # 結合文字・濁点など
+    )
+
+
+def grapheme_clusters(text: str) -> List[str]:
+    """
+    テキストを書記素クラスタ（見た目上の1文字）単位に分割する。
+    絵文字の ZWJ シーケンス・肌の色・国旗・結合文字を1単位として扱う簡易実装。
+    """
+    clusters: List[str] = []
+    prev = ""
+    for ch in text:
+        if clusters and (
+            _extends_cluster(ch)
+            or prev == _ZWJ
+            or (prev == "\r" and ch == "\n")
+            or (
+                _is_regional_indicator(ch)
+                and _is_regional_indicator(clusters[-1][-1])
+                and len(clusters[-1]) == 1
+            )
+        ):
+            clusters[-1] += ch
+        else:
+            clusters.append(ch)
+        prev = ch
+    return clusters
+
+
+def _break_priority(cluster: str, next_cluster: str) -> int:
+    if "\n" in cluster:
+        return _BREAK_LINE
+    if cluster in _SENTENCE_ENDS:
+        return _BREAK_SENTENCE
+    if cluster == "." and (not next_cluster or next_cluster.isspace()):
+        return _BREAK_SENTENCE
+    if cluster.isspace() or cluster in _SOFT_BREAKS:
+        return _BREAK_SPACE
+    return 0
+
+
+def _breakable_positions(text: str, clusters: List[str]) -> List[bool]:
+    """各クラスタの直前で分割してよいか（URL 内部は不可）"""
+    breakable = [True] * (len(clusters) + 1)
+    urls = [(m.start(), m.end()) for m in _URL_PATTERN.finditer(text)]
+    if not urls:
+        return breakable
+
+    offset = 0
+    url_idx = 0
+    for i, cluster in enumerate(clusters):
+        while url_idx < len(urls) and urls[url_idx][1] <= offset:
+            url_idx += 1
+        if url_idx < len(urls) and urls[url_idx][0] < offset:
+            breakable[i] = False
+        offset += len(cluster)
+    return breakable
+
+
+def _choose_cut(
+    candidates: List[int], breakable: List[bool], start: int, end: int, min_fill: int
+) -> int:
+    for priority in (_BREAK_LINE, _BREAK_SENTENCE, _BREAK_SPACE):
+        if candidates[priority] - start >= min_fill:
+            return candidates[priority]
+
+    cut = end
+    while cut > start + 1 and not breakable[cut]:
+        cut -= 1
+    # limit を超える長さの URL は分割せざるを得ない
+    return cut if breakable[cut] else end
+
+
+def split_text(text: str, limit: int) -> List[str]:
+    """
+    テキストを書記素クラスタ数 limit 以下のチャンクに1パスで分割する。
+    分割位置は 改行 > 文末 > 空白・読点 の順に優先し、URL の途中では切らない。
+    適切な位置がない場合のみ limit ちょうどで切る。
+    """
+    clusters = grapheme_clusters(text)
+    n = len(clusters)
+    breakable = _breakable_positions(text, clusters)
+
+    min_fill = max(1, limit // 3)
+    chunks: List[str] = []
+    start = 0
+    # 優先度ごとの直近の分割候補位置
+    candidates = [-1, -1, -1, -1]
+
+    for i in range(n):
+        if i - start >= limit:
+            cut = _choose_cut(candidates, breakable, start, i, min_fill)
+            chunks.append("".join(clusters[start:cut]))
+            start = cut
+            candidates = [c if c > cut else -1 for c in candidates]
+
+        next_cluster = clusters[i + 1] if i + 1 < n else ""
+        priority = _break_priority(clusters[i], next_cluster)
+        if priority and breakable[i + 1]:
+            candidates[priority] = i + 1
+
+    chunks.append("".join(clusters[start:]))
+    return [c.strip() for c in chunks if c.strip()]
+
+
+def trim_to_sentence_end(text: str) -> str:
+    """
+    出力上限で途中まで生成されたテキストを、最後の文末（改行を含む）で切る。
+    文末が見つからない場合はそのまま返す。
+    """
+    cut = max(text.rfind(ch) for ch in (*_SENTENCE_ENDS, "\n"))
+    return text[: cut + 1].rstrip() if cut > 0 else text
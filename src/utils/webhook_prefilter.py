@@ -0,0 +1,99 @@
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# PrefilteredPayload.items の種別
+KIND_EVENT = "event"
+KIND_LIGHT = "light"
+
+
+@dataclass(frozen=True, slots=True)
+class LightMessage:
+    """履歴への追加だけが必要なメッセージ（メンションなしのグループ発言など）"""
+
+    context_key: str
+    user_id: str
+    message_id: Optional[str]
+    text: str
+    mark_as_read_token: Optional[str] = None
+
+
+@dataclass
+class PrefilteredPayload:
+    destination: Optional[str] = None
+    # 受信順の (種別, 中身)。KIND_EVENT は SDK モデルへの変換が必要なイベント
+    # （生の dict のまま保持）、KIND_LIGHT は履歴キャッシュへ直接流し込むだけの
+    # LightMessage。後の発言が先の質問の文脈に入らないよう、この順に処理すること
+    items: List[Tuple[str, Any]] = field(default_factory=list)
+    # 処理対象外として捨てたイベント数（スタンプ・画像・unfollow など）
+    skipped: int = 0
+
+    @property
+    def full_events(self) -> List[Dict[str, Any]]:
+        return [item for kind, item in self.items if kind == KIND_EVENT]
+
+    @property
+    def light_messages(self) -> List[LightMessage]:
+        return [item for kind, item in self.items if kind == KIND_LIGHT]
+
+
+def context_key_from_source(source: Dict[str, Any]) -> str:
+    """生の source dict から ChatbotLogic と同じ形式の context_key を作る"""
+    src_type = source.get("type")
+    if src_type == "group":
+        return f"group:{source.get('groupId')}"
+    if src_type == "room":
+        return f"room:{source.get('roomId')}"
+    return f"user:{source.get('userId')}"
+
+
+def _mentions_self(message: Dict[str, Any]) -> bool:
+    mention = message.get("mention")
+    if not mention:
+        return False
+    return any(m.get("isSelf") for m in mention.get("mentionees") or [])
+
+
+def prefilter_events(body: str) -> PrefilteredPayload:
+    """Webhook ボディ（文字列）をパースして prefilter_parsed() にかける"""
+    return prefilter_parsed(json.loads(body))
+
+
+def prefilter_parsed(body_json: Dict[str, Any]) -> PrefilteredPayload:
+    """
+    パース済みの Webhook ボディを dict のまま走査し、イベントを振り分ける。
+    署名検証は呼び出し側で済ませておくこと。
+
+    - 1:1 のテキスト、メンション付きのグループ/ルームのテキスト、JoinEvent
+      -> KIND_EVENT（SDK モデルに変換してフルパイプラインへ）
+    - メンションなしのグループ/ルームのテキスト -> KIND_LIGHT（履歴追加のみ）
+    - それ以外 -> 破棄
+    """
+    payload = PrefilteredPayload(destination=body_json.get("destination"))
+
+    for event in body_json.get("events") or []:
+        event_type = event.get("type")
+        if event_type == "join":
+            payload.items.append((KIND_EVENT, event))
+            continue
+
+        message = event.get("message") or {}
+        if event_type != "message" or message.get("type") != "text":
+            payload.skipped += 1
+            continue
+
+        source = event.get("source") or {}
+        if source.get("type") not in ("group", "room") or _mentions_self(message):
+            payload.items.append((KIND_EVENT, event))
+            continue
+
+        light = LightMessage(
+            context_key=context_key_from_source(source),
+            user_id=source.get("userId") or "unknown",
+            message_id=message.get("id"),
+            text=message.get("text") or "",
+            mark_as_read_token=message.get("markAsReadToken"),
+        )
+        payload.items.append((KIND_LIGHT, light))
+
+    return payload
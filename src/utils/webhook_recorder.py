@@ -0,0 +1,128 @@
+import json
+import secrets
+import threading
+from typing import Optional
+
+from src.utils.anonymizer import mask_text, pseudonymize_ids
+
+# そのまま残すコマンド（処理の流れが変わるため）
+KEEP_TEXTS = ("/exit", "/bye")
+# 再送に使えないよう固定値に置き換えるトークン
+TOKEN_FIELDS = ("replyToken", "markAsReadToken", "quoteToken")
+DUMMY_TOKEN = "0" * 32
+
+# 記録するフィールド（再生に必要なものだけ）。位置情報の住所・座標、
+# ファイル名などの自由記述はここに含めず、記録しない
+BODY_FIELDS = ("destination", "events")
+EVENT_FIELDS = (
+    "type",
+    "mode",
+    "timestamp",
+    "source",
+    "webhookEventId",
+    "deliveryContext",
+    "replyToken",
+    "message",
+    "postback",
+    "joined",
+    "left",
+    "unsend",
+)
+SOURCE_FIELDS = ("type", "userId", "groupId", "roomId")
+MESSAGE_FIELDS = (
+    "type",
+    "id",
+    "text",
+    "mention",
+    "quotedMessageId",
+    "quoteToken",
+    "markAsReadToken",
+)
+MENTIONEE_FIELDS = ("index", "length", "type", "userId", "isSelf")
+
+
+def _pick(obj, fields) -> dict:
+    if not isinstance(obj, dict):
+        return {}
+    return {k: obj[k] for k in fields if k in obj}
+
+
+def _anonymize_message(message: dict) -> dict:
+    message = _pick(message, MESSAGE_FIELDS)
+    for field in TOKEN_FIELDS:
+        if field in message:
+            message[field] = DUMMY_TOKEN
+    text = message.get("text")
+    if text and text.strip().lower() not in KEEP_TEXTS:
+        message["text"] = mask_text(text)
+    mention = message.get("mention")
+    if mention is not None:
+        message["mention"] = {
+            "mentionees": [
+                _pick(m, MENTIONEE_FIELDS)
+                for m in _pick(mention, ("mentionees",)).get("mentionees") or []
+            ]
+        }
+    return message
+
+
+def _anonymize_event(event: dict) -> dict:
+    event = _pick(event, EVENT_FIELDS)
+    for field in TOKEN_FIELDS:
+        if field in event:
+            event[field] = DUMMY_TOKEN
+    if "source" in event:
+        event["source"] = _pick(event["source"], SOURCE_FIELDS)
+    if "message" in event:
+        event["message"] = _anonymize_message(event["message"])
+    if "postback" in event:
+        data = _pick(event["postback"], ("data",)).get("data")
+        event["postback"] = {"data": mask_text(data)} if data else {}
+    return event
+
+
+def anonymize_webhook_body(body: str, salt: str) -> str:
+    """
+    Webhook ボディを記録用に匿名化する。
+    再生に必要なフィールドだけを残し、本文は文字数を保って伏せ字、
+    トークンは固定値、LINE ID は salt 付きの仮名IDにする。
+    """
+    body_json = _pick(json.loads(body), BODY_FIELDS)
+    body_json["events"] = [
+        _anonymize_event(event) for event in body_json.get("events") or []
+    ]
+    return pseudonymize_ids(
+        json.dumps(body_json, ensure_ascii=False, separators=(",", ":")), salt
+    )
+
+
+class WebhookRecorder:
+    """
+    受信した Webhook ボディを匿名化し、受信時刻とともに JSONL に追記する。
+    記録したファイルは benchmarks/replay_webhooks.py で再生できる。
+    """
+
+    def __init__(self, path: str, salt: Optional[str] = None):
+        self.path = path
+        # プロセスごとの salt（同じファイル内では同じ ID は同じ仮名になる）
+        self.salt = salt or secrets.token_hex(16)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, body: str, received_at: float):
+        try:
+            anonymized = anonymize_webhook_body(body, self.salt)
+        except ValueError:
+            return
+        line = json.dumps(
+            {"ts": received_at, "body": anonymized},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,123 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from linebot.v3.webhooks import MessageEvent, TextMessageContent, UserSource
+
+from src.channels import Channel, ChannelRegistry, ChannelSpec, load_channels
+
+
+class TestChannels(unittest.TestCase):
+    def _write(self, data):
+        f = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False)
+        json.dump(data, f)
+        f.close()
+        self.addCleanup(os.unlink, f.name)
+        return f.name
+
+    def test_load_channels(self):
+        path = self._write(
+            {
+                "channels": [
+                    {
+                        "name": "shop",
+                        "destination": "Ushop",
+                        "channel_secret_env": "SHOP_SECRET",
+                        "access_token": "shop_token",
+                        "max_concurrency": 2,
+                    }
+                ]
+            }
+        )
+        with patch.dict(os.environ, {"SHOP_SECRET": "s3cret"}):
+            specs = load_channels(path)
+        assert specs == [ChannelSpec("shop", "s3cret", "shop_token", "Ushop", 2)]
+
+    def test_duplicate_names(self):
+        entry = {"name": "shop", "channel_secret": "s", "access_token": "t"}
+        path = self._write({"channels": [entry, entry]})
+        with self.assertRaises(ValueError):
+            load_channels(path)
+
+    def test_empty_secret_or_token(self):
+        # *_env の環境変数が未設定・空の場合も起動時に弾く
+        path = self._write(
+            {
+                "channels": [
+                    {
+                        "name": "shop",
+                        "channel_secret_env": "SHOP_SECRET",
+                        "access_token": "t",
+                    }
+                ]
+            }
+        )
+        with patch.dict(os.environ, {"SHOP_SECRET": ""}):
+            with self.assertRaises(ValueError):
+                load_channels(path)
+        path = self._write(
+            {"channels": [{"name": "shop", "channel_secret": "s", "access_token": ""}]}
+        )
+        with self.assertRaises(ValueError):
+            load_channels(path)
+
+    def test_default_channel(self):
+        # destination が一致しないボディは既定チャネルで処理する
+        default = Channel(ChannelSpec("default", "s", "t"), Mock())
+        shop = Channel(ChannelSpec("shop", "ss", "st", destination="Ushop"), Mock())
+        registry = ChannelRegistry([shop], default=default)
+        assert registry.for_destination("Ushop") is shop
+        assert registry.for_destination("Uother") is default
+        assert registry.for_destination(None) is default
+        assert registry.get("default") is default
+        assert len(registry) == 2
+        with self.assertRaises(ValueError):
+            ChannelRegistry(
+                [Channel(ChannelSpec("default", "a", "b"), Mock())], default
+            )
+
+    def test_zero_concurrency_is_unlimited(self):
+        channel = Channel(ChannelSpec("default", "s", "t", max_concurrency=0), Mock())
+        assert all(channel.try_acquire() for _ in range(100))
+        channel.release()
+        assert channel.stats.stats()["throttled"] == 0
+
+    def test_sessions_are_namespaced(self):
+        # OpenAIService を共有しても、同じユーザーIDのセッションはチャネルごとに分かれる
+        ai = Mock()
+        ai.get_response.return_value = "OK"
+        registry = ChannelRegistry.build(
+            [
+                ChannelSpec("a", "sa", "ta", destination="Ua"),
+                ChannelSpec("b", "sb", "tb", destination="Ub"),
+            ],
+            ai,
+        )
+        for name in ("a", "b"):
+            channel = registry.get(name)
+            channel.logic.line = Mock()
+            event = Mock(spec=MessageEvent)
+            event.source = UserSource(user_id="U1")
+            event.message = Mock(spec=TextMessageContent)
+            event.message.text = "こんにちは"
+            event.reply_token = "reply"
+            channel.logic.process_event(event)
+
+        keys = [c.args[0] for c in ai.get_response.call_args_list]
+        assert keys == ["a/user:U1", "b/user:U1"]
+        assert registry.for_destination("Ub").name == "b"
+        assert registry.for_destination("Uother") is None
+        assert set(registry.stats()) == {"a", "b"}
+
+    def test_concurrency_quota(self):
+        registry = ChannelRegistry.build(
+            [ChannelSpec("a", "sa", "ta", max_concurrency=1)], Mock()
+        )
+        channel = registry.get("a")
+        assert channel.try_acquire()
+        assert not channel.try_acquire()
+        channel.release()
+        assert channel.try_acquire()
+        assert channel.stats.stats()["throttled"] == 1
@@ -0,0 +1,31 @@
+import unittest
+from types import SimpleNamespace
+
+from src.services.delivery import PATH_PUSH, PATH_REPLY, DeliveryTracker
+
+
+class TestDeliveryTracker(unittest.TestCase):
+    def setUp(self):
+        self.tracker = DeliveryTracker(reply_deadline=50.0)
+
+    def test_event_age(self):
+        event = SimpleNamespace(timestamp=1_700_000_000_000)
+        assert self.tracker.event_age(event, now=1_700_000_012.5) == 12.5
+        # 時計のずれで未来の時刻になっても負にしない
+        assert self.tracker.event_age(event, now=1_699_999_999.0) == 0.0
+        assert self.tracker.event_age(SimpleNamespace(timestamp=None)) is None
+
+    def test_should_push(self):
+        assert not self.tracker.should_push(None)
+        assert not self.tracker.should_push(49.9)
+        assert self.tracker.should_push(50.0)
+
+    def test_stats(self):
+        self.tracker.record(PATH_REPLY, 1.0)
+        self.tracker.record(PATH_REPLY, None)
+        self.tracker.record(PATH_PUSH, 55.0)
+        stats = self.tracker.stats()
+        assert stats["paths"]["reply"]["count"] == 2
+        assert stats["paths"]["reply"]["p50_age_ms"] == 1000.0
+        assert stats["paths"]["push"]["count"] == 1
+        assert stats["paths"]["reply_failed_push"]["count"] == 0
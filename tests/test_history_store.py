@@ -0,0 +1,74 @@
+import unittest
+
+from src.utils.history_store import HistoryStore
+
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.store = HistoryStore(history_size=3, summary_size=2)
+
+    def test_ring_buffer_keeps_latest_in_order(self):
+        for i in range(5):
+            count = self.store.append("group:g1", f"user_{i % 2}", f"text{i}")
+        assert count == 5
+        assert self.store.history("group:g1") == [
+            ("user_0", "text2"),
+            ("user_1", "text3"),
+            ("user_0", "text4"),
+        ]
+
+    def test_speaker_ids_are_interned(self):
+        self.store.append("group:g1", "".join(["user", "_A"]), "a")
+        self.store.append("group:g2", "".join(["user", "_A"]), "b")
+        first = self.store.history("group:g1")[0][0]
+        second = self.store.history("group:g2")[0][0]
+        assert first is second
+
+    def test_summaries_are_capped(self):
+        for i in range(3):
+            self.store.add_summary("user:u1", f"要約{i}")
+        assert self.store.summaries("user:u1") == ["要約1", "要約2"]
+
+    def test_reset_keeps_history(self):
+        self.store.append("user:u1", "u1", "hello")
+        self.store.add_summary("user:u1", "要約")
+        self.store.reset("user:u1")
+        assert self.store.message_count("user:u1") == 0
+        assert self.store.summaries("user:u1") == []
+        assert self.store.history("user:u1") == [("u1", "hello")]
+
+    def test_export_import_roundtrip(self):
+        for i in range(4):
+            self.store.append("group:g1", "user_A", f"text{i}")
+        self.store.add_summary("group:g1", "要約")
+
+        restored = HistoryStore(history_size=3, summary_size=2)
+        restored.import_state(self.store.export_state())
+
+        assert restored.history("group:g1") == self.store.history("group:g1")
+        assert restored.message_count("group:g1") == 4
+        assert restored.summaries("group:g1") == ["要約"]
+
+    def test_export_is_a_copy(self):
+        # 圧縮はロック外で書き出すため、書き出し後の変更がコピーに混ざらない
+        self.store.append("group:g1", "user_A", "text0")
+        self.store.add_summary("group:g1", "要約")
+        exported = self.store.export_state()
+        self.store.append("group:g1", "user_A", "text1")
+        self.store.add_summary("group:g1", "要約2")
+
+        restored = HistoryStore(history_size=3, summary_size=2)
+        restored.import_state(exported)
+        assert restored.history("group:g1") == [("user_A", "text0")]
+        assert restored.summaries("group:g1") == ["要約"]
+
+    def test_import_legacy_entries(self):
+        restored = HistoryStore(history_size=3, summary_size=2)
+        restored.import_state({"group:g1": ([("user_A", "a"), ("user_B", "b")], 2, [])})
+        assert restored.history("group:g1") == [("user_A", "a"), ("user_B", "b")]
+        assert restored.message_count("group:g1") == 2
+
+    def test_unknown_context(self):
+        assert self.store.history("missing") == []
+        assert self.store.summaries("missing") == []
+        assert "missing" not in self.store
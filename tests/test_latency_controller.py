@@ -0,0 +1,53 @@
+import unittest
+
+from src.services.latency_controller import DegradationLevel, LatencyController
+from src.services.turn_router import Route
+
+
+class TestLatencyController(unittest.TestCase):
+    def setUp(self):
+        self.controller = LatencyController(
+            target_p95=1.0, window=10, min_samples=5, recover_ratio=0.5
+        )
+
+    def _feed(self, seconds: float, n: int):
+        for _ in range(n):
+            self.controller.record("total", seconds)
+
+    def test_escalates_one_step_per_window(self):
+        self._feed(2.0, 4)
+        assert self.controller.level == DegradationLevel.NORMAL
+        self._feed(2.0, 1)
+        assert self.controller.level == DegradationLevel.SKIP_SUMMARY
+        # 変更後は新しいサンプルがたまるまで判定しない
+        self._feed(2.0, 4)
+        assert self.controller.level == DegradationLevel.SKIP_SUMMARY
+        self._feed(2.0, 16)
+        assert self.controller.level == DegradationLevel.SHORT_HISTORY
+
+    def test_recovers_with_hysteresis(self):
+        self._feed(2.0, 10)
+        assert self.controller.level == DegradationLevel.NO_WEB_SEARCH
+        # 目標内でも recover_ratio を下回るまでは戻さない
+        self._feed(0.8, 10)
+        assert self.controller.level == DegradationLevel.NO_WEB_SEARCH
+        self._feed(0.1, 15)
+        assert self.controller.level == DegradationLevel.NORMAL
+
+    def test_apply_and_history_limit(self):
+        route = Route("default", max_output_tokens=None)
+        assert self.controller.apply(route) is route
+        assert self.controller.history_limit(10) == 10
+
+        self.controller.level = DegradationLevel.SHORT_HISTORY
+        degraded = self.controller.apply(route)
+        assert degraded.web_search is False
+        assert degraded.max_output_tokens == self.controller.tight_output_tokens
+        assert self.controller.skip_summarization
+        assert self.controller.history_limit(10) == self.controller.short_history
+
+    def test_stats(self):
+        self.controller.record("ai", 0.5)
+        stats = self.controller.stats()
+        assert stats["level_name"] == "NORMAL"
+        assert stats["stages"]["ai"]["p95_ms"] == 500.0
@@ -0,0 +1,39 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from linebot.v3.messaging import ApiException, MessagingApi
+
+from src.services.line_service import LineService, ReplyTokenError
+
+
+def _api_error(status: int, body: bytes) -> ApiException:
+    http_resp = SimpleNamespace(
+        status=status, reason="Bad Request", data=body, getheaders=lambda: {}
+    )
+    return ApiException(http_resp=http_resp)
+
+
+class TestReplyMessage(unittest.TestCase):
+    def setUp(self):
+        self.service = LineService("token")
+
+    def test_invalid_reply_token(self):
+        error = _api_error(400, b'{"message":"Invalid reply token"}')
+        with patch.object(
+            MessagingApi, "reply_message_with_http_info", side_effect=error
+        ):
+            with self.assertRaises(ReplyTokenError):
+                self.service.reply_message("reply-token", "こんにちは")
+
+    def test_other_bad_request_is_reraised(self):
+        # メッセージの不備など、返信トークン以外の 400 はプッシュで再送しない
+        error = _api_error(
+            400, b'{"message":"The request body has 1 error(s)","details":[]}'
+        )
+        with patch.object(
+            MessagingApi, "reply_message_with_http_info", side_effect=error
+        ):
+            with self.assertRaises(ApiException) as ctx:
+                self.service.reply_message("reply-token", "こんにちは")
+        assert not isinstance(ctx.exception, ReplyTokenError)
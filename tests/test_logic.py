@@ -1,3 +1,4 @@
+import time
 import unittest
 from unittest.mock import Mock
 
@@ -10,6 +11,9 @@ from linebot.v3.webhooks import (
 )
 
 from src.logic import ChatbotLogic
+from src.services.latency_controller import DegradationLevel
+from src.services.line_service import ReplyTokenError
+from src.utils.webhook_prefilter import LightMessage
 
 
 class TestChatbotLogic(unittest.TestCase):
@@ -90,9 +94,15 @@ class TestChatbotLogic(unittest.TestCase):
 
         self.logic.process_event(event)
 
-        self.mock_ai.get_response.assert_called_with("user:user_123", "こんにちは")
+        self.mock_ai.get_response.assert_called_with(
+            "user:user_123",
+            "こんにちは",
+            route=self.logic.router.classify("こんにちは"),
+        )
         self.mock_line.reply_message.assert_called_with(
-            "reply_token_789", "こんにちは！何かお手伝いしましょうか？"
+            "reply_token_789",
+            "こんにちは！何かお手伝いしましょうか？",
+            push_to="user_123",
         )
 
     def test_mark_as_read_failure_does_not_stop_execution(self):
@@ -110,7 +120,9 @@ class TestChatbotLogic(unittest.TestCase):
         self.logic.process_event(event)
 
         self.mock_line.mark_as_read.assert_called_once()
-        self.mock_line.reply_message.assert_called_with("reply_token", "OK")
+        self.mock_line.reply_message.assert_called_with(
+            "reply_token", "OK", push_to="user_123"
+        )
 
     def test_strip_self_mentions(self):
         # メンション除去のテスト
@@ -175,8 +187,7 @@ class TestChatbotLogic(unittest.TestCase):
 
         # 10件目で summarize が呼ばれる
         self.mock_ai.summarize.assert_called_once_with(context_key)
-        assert len(self.logic._context_summaries[context_key]) == 1
-        assert self.logic._context_summaries[context_key][0] == "これまでのまとめ"
+        assert self.logic._contexts.summaries(context_key) == ["これまでのまとめ"]
 
         # 11件目の入力にサマリーが含まれることの確認
         event = Mock(spec=MessageEvent)
@@ -300,3 +311,101 @@ class TestChatbotLogic(unittest.TestCase):
         self.assertIn("おすすめ教えて", input_text)
         self.assertIn("---直近の会話内容---", input_text)
         self.assertIn("ユーザー(er_A)", input_text)  # user_A の末尾4文字
+
+    def test_record_message_updates_history_only(self):
+        # 軽量レコードは履歴・キャッシュ更新と既読処理のみ行う
+        message = LightMessage("group:g1", "user_A", "msg_1", "やあ", "read_token")
+        self.logic.record_message(message)
+
+        assert self.logic._contexts.history("group:g1") == [("user_A", "やあ")]
+        assert self.logic._message_cache["msg_1"] == "やあ"
+        self.mock_line.mark_as_read.assert_called_once_with("read_token")
+        self.mock_ai.get_response.assert_not_called()
+
+    def test_route_is_selected_and_recorded(self):
+        # 挨拶は Web 検索なしのルート、最新情報の質問は検索ありのルート
+        self.mock_ai.get_response.return_value = "OK"
+        for i, text in enumerate(["こんにちは！", "今日のニュースを教えて"]):
+            event = Mock(spec=MessageEvent)
+            event.source = UserSource(user_id="user_123")
+            event.message = Mock(spec=TextMessageContent)
+            event.message.id = f"msg_{i}"
+            event.message.text = text
+            event.reply_token = f"reply_{i}"
+            self.logic.process_event(event)
+
+        routes = [c.kwargs["route"] for c in self.mock_ai.get_response.call_args_list]
+        assert [r.name for r in routes] == ["small_talk", "search"]
+        assert routes[0].web_search is False
+        assert routes[1].web_search is True
+        stats = self.logic.router.stats()
+        assert stats["small_talk"]["count"] == 1
+        assert stats["search"]["count"] == 1
+
+    def test_degraded_mode_sheds_optional_work(self):
+        # 最大劣化レベルではサマライズ・Web検索を止め、履歴を絞る
+        self.logic.controller.level = DegradationLevel.SHORT_HISTORY
+        self.mock_ai.get_response.return_value = "OK"
+        for i in range(1, 11):
+            event = Mock(spec=MessageEvent)
+            event.source = UserSource(user_id="user_123")
+            event.message = Mock(spec=TextMessageContent)
+            event.message.id = f"msg_{i}"
+            event.message.text = f"今日の話題{i}"
+            event.reply_token = f"reply_{i}"
+            self.logic.process_event(event)
+
+        self.mock_ai.summarize.assert_not_called()
+        call_args = self.mock_ai.get_response.call_args
+        assert call_args.kwargs["route"].web_search is False
+        input_text = call_args[0][1]
+        assert "今日の話題9" in input_text
+        assert "今日の話題6" not in input_text
+
+    def _text_event(self, source, text, timestamp=None):
+        event = Mock(spec=MessageEvent)
+        event.source = source
+        event.message = Mock(spec=TextMessageContent)
+        event.message.text = text
+        event.message.mention = None
+        event.reply_token = "reply_token"
+        event.timestamp = timestamp
+        return event
+
+    def test_stale_event_is_pushed(self):
+        # 返信期限を過ぎたイベントは返信トークンを使わずプッシュする
+        self.mock_ai.get_response.return_value = "OK"
+        stale = int((time.time() - 120) * 1000)
+        event = self._text_event(UserSource(user_id="user_123"), "質問", stale)
+
+        self.logic.process_event(event)
+
+        self.mock_line.reply_message.assert_not_called()
+        self.mock_line.push_message.assert_called_once_with("user_123", "OK")
+        self.mock_line.show_loading.assert_called_once_with("user_123")
+        stats = self.logic.delivery.stats()
+        assert stats["paths"]["push"]["count"] == 1
+        assert stats["paths"]["push"]["p50_age_ms"] >= 120000
+        assert stats["loading_shown"] == 1
+
+    def test_reply_token_error_falls_back_to_push(self):
+        # 返信トークンが使えなかった場合はグループへプッシュする
+        self.mock_ai.get_response.return_value = "OK"
+        self.mock_line.reply_message.side_effect = ReplyTokenError("Invalid")
+        event = self._text_event(
+            GroupSource(group_id="group_123", user_id="user_123"),
+            "@bot 質問",
+            int(time.time() * 1000),
+        )
+        mention = Mock()
+        mention.mentionees = [Mock(is_self=True, index=0, length=4)]
+        event.message.mention = mention
+
+        self.logic.process_event(event)
+
+        self.mock_line.push_message.assert_called_once_with("group_123", "OK")
+        # ローディング表示は1対1のトークのみ
+        self.mock_line.show_loading.assert_not_called()
+        stats = self.logic.delivery.stats()["paths"]
+        assert stats["reply_failed_push"]["count"] == 1
+        assert stats["reply"]["count"] == 0
@@ -50,6 +50,232 @@ class TestWebhookEndpoint:
         response = client.post("/webhook", data="{}")
         assert response.status_code == 400
 
+    def test_webhook_routes_light_and_full_events(self):
+        """メンションなしは履歴追加のみ、1:1 はフルパイプラインへ"""
+        import base64
+        import hashlib
+        import hmac
+        import json
+
+        from src import main
+
+        body = json.dumps(
+            {
+                "destination": "Ubot",
+                "events": [
+                    {
+                        "type": "message",
+                        "mode": "active",
+                        "timestamp": 0,
+                        "webhookEventId": "ev1",
+                        "deliveryContext": {"isRedelivery": False},
+                        "replyToken": "reply",
+                        "source": {"type": "user", "userId": "U1"},
+                        "message": {
+                            "type": "text",
+                            "id": "m1",
+                            "quoteToken": "q",
+                            "text": "hi",
+                        },
+                    },
+                    {
+                        "type": "message",
+                        "source": {"type": "group", "groupId": "G1", "userId": "U2"},
+                        "message": {"type": "text", "id": "m2", "text": "yo"},
+                    },
+                ],
+            }
+        )
+        secret = main.signature_validator.channel_secret
+        signature = base64.b64encode(
+            hmac.new(secret, body.encode("utf-8"), hashlib.sha256).digest()
+        ).decode()
+
+        with (
+            patch.object(main.chatbot_logic, "process_event") as process_event,
+            patch.object(main.chatbot_logic, "record_message") as record_message,
+        ):
+            client = main.app.test_client()
+            response = client.post(
+                "/webhook", data=body, headers={"X-Line-Signature": signature}
+            )
+
+        assert response.status_code == 200
+        process_event.assert_called_once()
+        assert process_event.call_args[0][0].message.text == "hi"
+        record_message.assert_called_once()
+        assert record_message.call_args[0][0].context_key == "group:G1"
+        # 既定チャネルも追加チャネルと同じく計測される
+        assert main.channel_registry.stats()["default"]["events"] >= 2
+
+    def test_process_payload_keeps_arrival_order(self):
+        """1つのボディ内のイベントを受信順に処理する"""
+        from src import main
+        from src.utils.webhook_prefilter import prefilter_parsed
+
+        mention = {
+            "mentionees": [
+                {
+                    "index": 0,
+                    "length": 4,
+                    "type": "user",
+                    "userId": "Ubot",
+                    "isSelf": True,
+                }
+            ]
+        }
+        body_json = {
+            "events": [
+                {
+                    "type": "message",
+                    "mode": "active",
+                    "timestamp": 0,
+                    "webhookEventId": "ev1",
+                    "deliveryContext": {"isRedelivery": False},
+                    "replyToken": "reply",
+                    "source": {"type": "group", "groupId": "G1", "userId": "U1"},
+                    "message": {
+                        "type": "text",
+                        "id": "m1",
+                        "quoteToken": "q",
+                        "text": "@bot question",
+                        "mention": mention,
+                    },
+                },
+                {
+                    "type": "message",
+                    "source": {"type": "group", "groupId": "G1", "userId": "U2"},
+                    "message": {"type": "text", "id": "m2", "text": "later msg"},
+                },
+            ]
+        }
+        calls = Mock()
+        with (
+            patch.object(main.chatbot_logic, "process_event", calls.process_event),
+            patch.object(main.chatbot_logic, "record_message", calls.record_message),
+        ):
+            main.process_payload(main.chatbot_logic, prefilter_parsed(body_json))
+
+        assert [c[0] for c in calls.mock_calls] == ["process_event", "record_message"]
+
+    def test_webhook_routes_to_channel(self):
+        """destination またはパスで追加チャネルへ振り分ける"""
+        import base64
+        import hashlib
+        import hmac
+        import json
+
+        from src import main
+        from src.channels import Channel, ChannelRegistry, ChannelSpec
+
+        spec = ChannelSpec("shop", "shop_secret", "shop_token", destination="Ushop")
+        mock_logic = Mock()
+        channel = Channel(spec, mock_logic)
+        body = json.dumps(
+            {
+                "destination": "Ushop",
+                "events": [
+                    {
+                        "type": "message",
+                        "source": {"type": "group", "groupId": "G1", "userId": "U2"},
+                        "message": {"type": "text", "id": "m2", "text": "yo"},
+                    }
+                ],
+            }
+        )
+        signature = base64.b64encode(
+            hmac.new(b"shop_secret", body.encode("utf-8"), hashlib.sha256).digest()
+        ).decode()
+        headers = {"X-Line-Signature": signature}
+
+        with (
+            patch.object(
+                main,
+                "channel_registry",
+                ChannelRegistry([channel], default=main.default_channel),
+            ),
+            patch.object(main.chatbot_logic, "record_message") as default_record,
+        ):
+            client = main.app.test_client()
+            assert (
+                client.post("/webhook", data=body, headers=headers).status_code == 200
+            )
+            assert (
+                client.post("/webhook/shop", data=body, headers=headers).status_code
+                == 200
+            )
+            assert (
+                client.post("/webhook/none", data=body, headers=headers).status_code
+                == 404
+            )
+            # 同時処理数の上限に達している場合は 429
+            for _ in range(spec.max_concurrency):
+                channel.try_acquire()
+            response = client.post("/webhook/shop", data=body, headers=headers)
+            assert response.status_code == 429
+
+        assert mock_logic.record_message.call_count == 2
+        default_record.assert_not_called()
+        stats = channel.stats.stats()
+        assert stats["requests"] == 2
+        assert stats["events"] == 2
+        assert stats["throttled"] == 1
+
+
+class TestDebugEndpoint:
+    """デバッグ用エンドポイントのテスト"""
+
+    def test_disabled_without_token(self):
+        from src import main
+        from src.config import Config
+
+        with patch.object(main, "config", Config(debug_token="")):
+            response = main.app.test_client().get("/debug/stats")
+        assert response.status_code == 404
+
+    def test_requires_bearer_token(self):
+        from src import main
+        from src.config import Config
+
+        client = main.app.test_client()
+        with patch.object(main, "config", Config(debug_token="secret")):
+            denied = client.get("/debug/stats")
+            allowed = client.get(
+                "/debug/stats", headers={"Authorization": "Bearer secret"}
+            )
+        assert denied.status_code == 401
+        assert allowed.status_code == 200
+        assert "routes" in allowed.json
+
+    def test_profile_next_events(self):
+        from src import main
+        from src.config import Config
+
+        client = main.app.test_client()
+        headers = {"Authorization": "Bearer secret"}
+        with patch.object(main, "config", Config(debug_token="secret")):
+            assert client.get("/debug/profile", headers=headers).status_code == 404
+            bad = client.post("/debug/profile?mode=wall&events=1", headers=headers)
+            assert bad.status_code == 400
+
+            armed = client.post("/debug/profile?events=1", headers=headers)
+            assert armed.status_code == 202
+            assert client.get("/debug/profile", headers=headers).status_code == 202
+            busy = client.post("/debug/profile?seconds=1", headers=headers)
+            assert busy.status_code == 409
+
+            with main.profiler.track_event():
+                pass
+            done = client.get("/debug/profile", headers=headers)
+            assert done.status_code == 200
+            assert done.mimetype == "text/plain"
+
+            # シャーディング時はイベント処理がワーカーで行われるため受け付けない
+            with patch.object(main, "shard_pool", Mock()):
+                sharded = client.post("/debug/profile?events=1", headers=headers)
+            assert sharded.status_code == 400
+            assert not main.profiler.running
+
 
 class TestOpenAIService:
     """OpenAIServiceのテスト"""
@@ -89,6 +315,96 @@ class TestOpenAIService:
         call_args = mock_client.responses.create.call_args
         assert call_args.kwargs["previous_response_id"] == "prev_id"
 
+    @patch("src.services.openai_service.OpenAI")
+    def test_get_response_applies_route(self, mock_openai_class):
+        from src.services.openai_service import OpenAIService
+        from src.services.turn_router import Route
+
+        mock_client = mock_openai_class.return_value
+        mock_client.responses.create.return_value = Mock(id="r", output_text="Hi")
+
+        service = OpenAIService("fake_key")
+        route = Route("small_talk", model="gpt-4.1-nano", web_search=False)
+        service.get_response("user_123", "Hi", route=Route("default"))
+        service.get_response("user_123", "Hi", route=route)
+
+        first, second = mock_client.responses.create.call_args_list
+        assert first.kwargs["tools"] == [{"type": "web_search"}]
+        assert "tools" not in second.kwargs
+        assert second.kwargs["model"] == "gpt-4.1-nano"
+
+    @patch("src.services.openai_service.OpenAI")
+    def test_tight_output_shortens_length_instruction(self, mock_openai_class):
+        """文字数の指示は毎ターン1つだけ（出力上限に合わせる）、途中で切れた文は落とす"""
+        from src.services.latency_controller import DegradationLevel, LatencyController
+        from src.services.openai_service import OpenAIService
+        from src.services.turn_router import Route
+
+        mock_client = mock_openai_class.return_value
+        mock_client.responses.create.return_value = Mock(
+            id="r", output_text="OK", status="completed"
+        )
+        service = OpenAIService("fake_key")
+        service.get_response("user_123", "Hi", route=Route("default"))
+
+        controller = LatencyController()
+        controller.level = DegradationLevel.TIGHT_OUTPUT
+        mock_client.responses.create.return_value = Mock(
+            id="r2", output_text="一文目です。二文目は途中", status="incomplete"
+        )
+        reply = service.get_response(
+            "user_123", "Hi", route=controller.apply(Route("default"))
+        )
+
+        first, second = mock_client.responses.create.call_args_list
+        assert first.kwargs["instructions"] == "回答は必ず500文字以内で行ってください。"
+        # 保存されるチェーンの入力には文字数の指示を含めない
+        assert first.kwargs["input"] == [{"role": "user", "content": "Hi"}]
+        assert second.kwargs["max_output_tokens"] == 200
+        assert (
+            second.kwargs["instructions"] == "回答は必ず160文字以内で行ってください。"
+        )
+        assert reply == "一文目です。"
+
+    @patch("src.services.openai_service.OpenAI")
+    def test_chain_rotates_after_max_turns(self, mock_openai_class):
+        from src.services.openai_service import OpenAIService
+
+        mock_client = mock_openai_class.return_value
+        service = OpenAIService("fake_key", max_chain_turns=2)
+        for i in range(3):
+            mock_client.responses.create.return_value = Mock(
+                id=f"resp_{i}", output_text="OK", usage=Mock(input_tokens=100 * (i + 1))
+            )
+            service.get_response("user_123", "Hi")
+
+        calls = mock_client.responses.create.call_args_list
+        assert "previous_response_id" not in calls[0].kwargs
+        assert calls[1].kwargs["previous_response_id"] == "resp_0"
+        # 3ターン目は新しいチェーン
+        assert "previous_response_id" not in calls[2].kwargs
+        assert calls[2].kwargs["input"][0]["role"] == "user"
+        assert service.chain_turns["user_123"] == 1
+
+        usage = service.usage_stats()
+        assert usage["rotations"] == 1
+        assert usage["max_input_tokens"] == 300
+
+    @patch("src.services.openai_service.OpenAI")
+    def test_chain_rotates_on_input_tokens(self, mock_openai_class):
+        from src.services.openai_service import OpenAIService
+
+        mock_client = mock_openai_class.return_value
+        mock_client.responses.create.return_value = Mock(
+            id="resp_big", output_text="OK", usage=Mock(input_tokens=5000)
+        )
+        service = OpenAIService("fake_key", max_chain_input_tokens=4000)
+        service.get_response("user_123", "Hi")
+        service.get_response("user_123", "Hi")
+
+        second = mock_client.responses.create.call_args_list[1]
+        assert "previous_response_id" not in second.kwargs
+
     def test_clear_session(self):
         from src.services.openai_service import OpenAIService
 
@@ -121,6 +437,43 @@ class TestLineService:
         assert len(messages[0].text) == 160
         assert len(messages[1].text) == 10
 
+    @patch("src.services.line_service.ApiClient")
+    @patch("src.services.line_service.MessagingApi")
+    def test_reply_message_overflow_is_pushed(
+        self, mock_msg_api_class, mock_api_client_class
+    ):
+        from src.services.line_service import LineService
+
+        mock_api = mock_msg_api_class.return_value
+
+        service = LineService("fake_token")
+        # 12吹き出し分 -> 返信5件 + プッシュ5件 + プッシュ2件
+        long_text = "あ" * (160 * 12)
+        service.reply_message("token", long_text, push_to="group_123")
+
+        reply = mock_api.reply_message_with_http_info.call_args[0][0]
+        assert len(reply.messages) == 5
+        pushes = [c[0][0] for c in mock_api.push_message_with_http_info.call_args_list]
+        assert [len(p.messages) for p in pushes] == [5, 2]
+        assert all(p.to == "group_123" for p in pushes)
+
+    @patch("src.services.line_service.ApiClient")
+    @patch("src.services.line_service.MessagingApi")
+    def test_reply_message_overflow_without_push_target(
+        self, mock_msg_api_class, mock_api_client_class
+    ):
+        from src.services.line_service import LineService
+
+        mock_api = mock_msg_api_class.return_value
+
+        service = LineService("fake_token")
+        service.reply_message("token", "あ" * (160 * 7))
+
+        reply = mock_api.reply_message_with_http_info.call_args[0][0]
+        assert len(reply.messages) == 5
+        assert len(reply.messages[-1].text) == 160 * 3 + 2
+        mock_api.push_message_with_http_info.assert_not_called()
+
     @patch("src.services.line_service.ApiClient")
     @patch("src.services.line_service.MessagingApi")
     def test_mark_as_read(self, mock_msg_api_class, mock_api_client_class):
@@ -0,0 +1,104 @@
+import time
+import unittest
+
+from src.utils.profiler import (
+    MODE_ALLOC,
+    MODE_CPU,
+    ProfilerBusyError,
+    ProfilerManager,
+)
+from src.utils.text_splitter import split_text, trim_to_sentence_end
+
+
+def _busy_loop(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestProfilerManager(unittest.TestCase):
+    def setUp(self):
+        self.profiler = ProfilerManager(interval=0.001)
+
+    def test_profiles_next_events_only(self):
+        self.profiler.arm(2, MODE_CPU)
+        assert self.profiler.running
+
+        for _ in range(2):
+            with self.profiler.track_event():
+                _busy_loop(0.05)
+
+        assert not self.profiler.running
+        result = self.profiler.result()
+        assert "_busy_loop (test_profiler.py:" in result
+        # collapsed 形式: "frame;frame;... count"
+        stack, count = result.splitlines()[0].rsplit(" ", 1)
+        assert ";" in stack and int(count) > 0
+
+        # 計測終了後のイベントは対象外
+        with self.profiler.track_event():
+            pass
+        assert self.profiler.result() == result
+
+    def test_arm_times_out(self):
+        # イベントが来なくても期限で打ち切り、次のプロファイルを開始できる
+        self.profiler.arm(5, MODE_CPU, timeout=0.05)
+        with self.profiler.track_event():
+            _busy_loop(0.01)
+        deadline = time.monotonic() + 2
+        while self.profiler.running and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not self.profiler.running
+        assert self.profiler.result() is not None
+        self.profiler.arm(1, MODE_CPU, timeout=0.05)
+        with self.profiler.track_event():
+            pass
+        assert not self.profiler.running
+        # 前のセッションの期限切れが新しいセッションを打ち切らない
+        self.profiler.arm(1, MODE_CPU, timeout=10)
+        time.sleep(0.1)
+        assert self.profiler.running
+        with self.profiler.track_event():
+            pass
+
+    def test_alloc_mode_reports_top_sites(self):
+        self.profiler.arm(1, MODE_ALLOC)
+        with self.profiler.track_event():
+            chunks = split_text("あいうえお。" * 2000, 10)
+        result = self.profiler.result()
+        assert result.startswith("# total")
+        assert "net growth over 1 events" in result
+        assert "text_splitter.py" in result
+        del chunks
+
+    def test_alloc_mode_counts_only_event_growth(self):
+        # イベント外の確保（src/ を経由しない確保・イベント前の確保）は含めない
+        self.profiler.arm(1, MODE_ALLOC)
+        before = split_text("かきくけこ。" * 2000, 10)
+        with self.profiler.track_event():
+            local = [bytearray(1024) for _ in range(200)]
+            kept = trim_to_sentence_end("さしすせそ。" * 2000 + "たち")
+        result = self.profiler.result()
+        assert "text_splitter.py" in result
+        assert "test_profiler.py" not in result
+        # イベント前の split_text（約 190KB）は数えない
+        total = int(result.split()[2])
+        assert 0 < total < 100_000
+        del before, local, kept
+
+    def test_run_for(self):
+        result = self.profiler.run_for(0.01, MODE_CPU)
+        assert isinstance(result, str)
+        assert not self.profiler.running
+
+    def test_only_one_profile_at_a_time(self):
+        self.profiler.arm(1, MODE_CPU)
+        with self.assertRaises(ProfilerBusyError):
+            self.profiler.arm(1, MODE_ALLOC)
+        with self.profiler.track_event():
+            pass
+        assert not self.profiler.running
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            self.profiler.arm(1, "wall")
@@ -0,0 +1,166 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from src.sharding import HashRing, KeyedExecutor, ShardPool
+from src.utils.webhook_prefilter import (
+    KIND_EVENT,
+    KIND_LIGHT,
+    LightMessage,
+    PrefilteredPayload,
+)
+
+
+def _record_worker(shard_id, queue, journal_dir, threads):
+    """受け取った context_key をシャードごとのファイルに書く（spawn 用）"""
+    path = os.path.join(journal_dir, f"shard-{shard_id}.txt")
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+        kind, context_key, payload = item
+        if getattr(payload, "text", None) == "crash":
+            os._exit(1)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(f"{context_key}\n")
+
+
+def _read_keys(directory, shard):
+    path = os.path.join(directory, f"shard-{shard}.txt")
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return f.read().split()
+
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestHashRing(unittest.TestCase):
+    def test_removal_moves_only_removed_keys(self):
+        ring = HashRing(range(4))
+        keys = [f"user:U{i}" for i in range(2000)]
+        before = {key: ring.node_for(key) for key in keys}
+        # 負荷がおおむね均等に分かれる
+        counts = [list(before.values()).count(node) for node in range(4)]
+        assert min(counts) > 300
+
+        ring.remove(2)
+        for key in keys:
+            if before[key] != 2:
+                assert ring.node_for(key) == before[key]
+            else:
+                assert ring.node_for(key) != 2
+
+    def test_empty_ring(self):
+        with self.assertRaises(LookupError):
+            HashRing().node_for("user:U1")
+
+
+class TestKeyedExecutor(unittest.TestCase):
+    def test_same_key_runs_in_order(self):
+        executor = KeyedExecutor(max_workers=4)
+        results = {"a": [], "b": []}
+        lock = threading.Lock()
+
+        def task(key, i):
+            time.sleep(0.001)
+            with lock:
+                results[key].append(i)
+
+        for i in range(50):
+            executor.submit("a", task, "a", i)
+            executor.submit("b", task, "b", i)
+        executor.shutdown()
+        assert results["a"] == list(range(50))
+        assert results["b"] == list(range(50))
+
+
+class TestShardPool(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.pool = ShardPool(
+            2,
+            journal_dir=self.tmpdir.name,
+            worker_target=_record_worker,
+            max_restarts=1,
+            check_interval=0.05,
+        )
+
+    def tearDown(self):
+        self.pool.stop()
+        self.tmpdir.cleanup()
+
+    def _light(self, context_key, text="hi"):
+        return LightMessage(context_key, "U1", "m1", text, None)
+
+    def test_routes_by_context_key(self):
+        keys = [f"user:U{i}" for i in range(20)]
+        for key in keys:
+            self.pool.dispatch_light(self._light(key))
+        self.pool.dispatch_event(
+            {"type": "join", "source": {"type": "group", "groupId": "G1"}}
+        )
+        keys.append("group:G1")
+
+        def _all_written():
+            return sum(len(_read_keys(self.tmpdir.name, s)) for s in (0, 1)) == 21
+
+        assert _wait_for(_all_written)
+        for shard in (0, 1):
+            for key in _read_keys(self.tmpdir.name, shard):
+                assert self.pool.ring.node_for(key) == shard
+
+    def test_dispatch_payload_keeps_order(self):
+        join = {"type": "join", "source": {"type": "group", "groupId": "G1"}}
+        payload = PrefilteredPayload(
+            items=[(KIND_EVENT, join), (KIND_LIGHT, self._light("group:G1"))]
+        )
+        with patch.object(self.pool, "_put") as put:
+            self.pool.dispatch_payload(payload)
+        assert [c.args[0][:2] for c in put.call_args_list] == [
+            (KIND_EVENT, "group:G1"),
+            (KIND_LIGHT, "group:G1"),
+        ]
+
+    def test_restart_then_retire(self):
+        key = "user:U1"
+        shard = self.pool.ring.node_for(key)
+        self.pool.dispatch_light(self._light(key, "crash"))
+        # 1回目は同じシャードで再起動する
+        assert _wait_for(lambda: self.pool.stats()["shards"][str(shard)]["restarts"])
+        self.pool.dispatch_light(self._light(key))
+        assert _wait_for(lambda: _read_keys(self.tmpdir.name, shard) == [key])
+
+        # 上限を超えたらリングから外し、以降は残りのシャードが担当する
+        self.pool.dispatch_light(self._light(key, "crash"))
+        assert _wait_for(lambda: self.pool.stats()["retired"] == [shard])
+        self.pool.dispatch_light(self._light(key))
+        other = 1 - shard
+        assert _wait_for(lambda: _read_keys(self.tmpdir.name, other) == [key])
+
+    def test_restart_budget_decays(self):
+        # 再起動の回数は期間内の分だけ数え、間隔を空けた単発の停止では外さない
+        self.pool.restart_window = 0.3
+        key = "user:U1"
+        shard = self.pool.ring.node_for(key)
+        for restarts in (1, 2):
+            self.pool.dispatch_light(self._light(key, "crash"))
+            assert _wait_for(
+                lambda n=restarts: (
+                    self.pool.stats()["shards"][str(shard)]["restarts"] == n
+                )
+            )
+            time.sleep(0.4)
+        assert self.pool.stats()["retired"] == []
+        self.pool.dispatch_light(self._light(key))
+        assert _wait_for(lambda: _read_keys(self.tmpdir.name, shard) == [key])
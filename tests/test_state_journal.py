@@ -0,0 +1,214 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import Mock, patch
+
+from src.logic import ChatbotLogic
+from src.services.openai_service import OpenAIService
+from src.services.state_journal import StateJournal
+
+
+class TestStateJournal(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = self._tmp.name
+        patcher = patch("src.services.openai_service.OpenAI")
+        self.mock_openai_class = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self._tmp.cleanup)
+
+    def _build(self, compact_every=1000):
+        journal = StateJournal(self.directory, compact_every=compact_every)
+        ai = OpenAIService("fake_key", journal=journal)
+        logic = ChatbotLogic(Mock(), ai, journal=journal)
+        return journal, logic, ai
+
+    def _populate(self, logic, ai):
+        ai.summarize = Mock(return_value="まとめ")
+        for i in range(10):
+            logic._update_caches("group:g1", "user_A", f"msg_{i}", f"発言{i}")
+        ai.client.responses.create.return_value = Mock(id="resp_1", output_text="OK")
+        ai.get_response("group:g1", "こんにちは")
+
+    def _assert_restored(self, logic, ai):
+        assert ai.previous_responses == {"group:g1": "resp_1"}
+        assert logic._contexts.message_count("group:g1") == 10
+        assert logic._contexts.summaries("group:g1") == ["まとめ"]
+        assert logic._contexts.history("group:g1")[-1] == ("user_A", "発言9")
+        assert logic._message_cache["msg_3"] == "発言3"
+
+    def test_restore_from_journal(self):
+        journal, logic, ai = self._build()
+        self._populate(logic, ai)
+        journal.close()
+
+        journal2, logic2, ai2 = self._build()
+        ai2.summarize = Mock()
+        journal2.restore()
+
+        self._assert_restored(logic2, ai2)
+        # 復元時はサマライズを再実行しない
+        ai2.summarize.assert_not_called()
+
+    def test_restore_from_snapshot_and_journal(self):
+        journal, logic, ai = self._build(compact_every=5)
+        self._populate(logic, ai)
+        journal.close()
+        assert os.path.exists(journal.snapshot_path)
+        assert journal.stats()["compactions"] >= 1
+
+        journal2, logic2, ai2 = self._build(compact_every=5)
+        journal2.restore()
+        self._assert_restored(logic2, ai2)
+
+    def test_reset_and_clear_are_replayed(self):
+        journal, logic, ai = self._build()
+        self._populate(logic, ai)
+        ai.clear_session("group:g1")
+        logic._record_reset("group:g1")
+        journal.close()
+
+        journal2, logic2, ai2 = self._build()
+        journal2.restore()
+        assert ai2.previous_responses == {}
+        assert logic2._contexts.message_count("group:g1") == 0
+        assert logic2._contexts.summaries("group:g1") == []
+
+    def test_truncated_tail_is_discarded(self):
+        journal, logic, ai = self._build()
+        self._populate(logic, ai)
+        journal.close()
+        with open(journal.journal_path, "a", encoding="utf-8") as f:
+            f.write('[999,"logic","hist","gro')
+
+        journal2, logic2, ai2 = self._build()
+        journal2.restore()
+        self._assert_restored(logic2, ai2)
+
+        # 切り詰め後に追記しても次回の復元で読み込める
+        logic2._update_caches("group:g1", "user_B", "msg_x", "追記")
+        journal2.close()
+        journal3, logic3, _ = self._build()
+        journal3.restore()
+        assert logic3._message_cache["msg_x"] == "追記"
+
+    def test_compaction_during_change_is_not_applied_twice(self):
+        # 状態変更の直後（ジャーナル記録前）に別スレッドが圧縮しようとしても、
+        # 復元時に同じ変更が二重に適用されない
+        journal, logic, ai = self._build()
+        append_history = logic._append_history
+        compactors = []
+
+        def racing_append(*args):
+            count = append_history(*args)
+            t = threading.Thread(target=journal.compact)
+            t.start()
+            t.join(0.2)
+            compactors.append(t)
+            return count
+
+        logic._append_history = racing_append
+        logic._update_caches("user:U1", "user_A", "msg_1", "こんにちは")
+        for t in compactors:
+            t.join()
+        journal.close()
+
+        journal2, logic2, _ = self._build()
+        journal2.restore()
+        assert logic2._contexts.message_count("user:U1") == 1
+        assert logic2._contexts.history("user:U1") == [("user_A", "こんにちは")]
+
+    def test_concurrent_changes_and_compaction(self):
+        # 状態変更と圧縮が並行しても、復元結果は二重適用・取りこぼしなく一致する
+        journal, logic, ai = self._build(compact_every=7)
+        ai.summarize = Mock(return_value="")
+        errors = []
+        stop = threading.Event()
+
+        def writer(n):
+            try:
+                for i in range(200):
+                    logic._update_caches(f"user:U{n}-{i % 20}", "U", None, f"m{i}")
+            except Exception as e:  # pragma: no cover - 失敗時の報告用
+                errors.append(e)
+
+        def compactor():
+            while not stop.is_set():
+                try:
+                    journal.compact()
+                except Exception as e:  # pragma: no cover
+                    errors.append(e)
+
+        # スレッド切り替えを頻繁にして競合を起こしやすくする
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+        compact_thread = threading.Thread(target=compactor)
+        compact_thread.start()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stop.set()
+        compact_thread.join()
+        journal.close()
+        assert errors == []
+
+        journal2, logic2, _ = self._build(compact_every=7)
+        journal2.restore()
+        assert len(logic2._contexts) == 80
+        for key, state in logic._contexts.items():
+            assert logic2._contexts.message_count(key) == state.message_count == 10
+            assert logic2._contexts.history(key) == state.entries()
+
+    def test_compaction_writes_snapshot_in_background(self):
+        # pickle・fsync の間も状態変更はロックを待たずに進む
+        journal, logic, ai = self._build(compact_every=5)
+        started = threading.Event()
+        release = threading.Event()
+        write_snapshot = journal._write_snapshot
+
+        def slow_write(snapshot):
+            started.set()
+            release.wait(5)
+            write_snapshot(snapshot)
+
+        journal._write_snapshot = slow_write
+        self._populate(logic, ai)
+        assert started.wait(5)
+        logic._update_caches("group:g1", "user_B", "msg_x", "圧縮中の追記")
+        assert os.path.exists(journal.old_journal_path)
+        release.set()
+        journal.close()
+        assert not os.path.exists(journal.old_journal_path)
+        stats = journal.stats()
+        assert stats["compactions"] >= 1
+        assert stats["max_compaction_pause_ms"] > 0
+
+        journal2, logic2, ai2 = self._build()
+        journal2.restore()
+        assert logic2._message_cache["msg_x"] == "圧縮中の追記"
+        assert logic2._contexts.message_count("group:g1") == 11
+
+    def test_restore_after_interrupted_compaction(self):
+        # スナップショットの書き出し前に停止しても、切り離したジャーナルから復元する
+        journal, logic, ai = self._build(compact_every=5)
+        journal._write_snapshot = Mock(side_effect=OSError("disk full"))
+        with patch("traceback.print_exc"):
+            self._populate(logic, ai)
+            journal.close()
+        assert os.path.exists(journal.old_journal_path)
+        assert not os.path.exists(journal.snapshot_path)
+
+        journal2, logic2, ai2 = self._build()
+        journal2.restore()
+        self._assert_restored(logic2, ai2)
+        # 復元時に1つのスナップショットにまとめ、切り離したジャーナルは消える
+        assert not os.path.exists(journal2.old_journal_path)
+        journal2.close()
+        journal3, logic3, ai3 = self._build()
+        journal3.restore()
+        self._assert_restored(logic3, ai3)
@@ -0,0 +1,67 @@
+import unittest
+
+from src.utils.text_splitter import (
+    grapheme_clusters,
+    split_text,
+    trim_to_sentence_end,
+)
+
+
+class TestGraphemeClusters(unittest.TestCase):
+    def test_emoji_sequences_are_single_clusters(self):
+        family = "👨‍👩‍👧"
+        text = f"{family}🇯🇵👍🏽1️⃣が"
+        assert grapheme_clusters(text) == [family, "🇯🇵", "👍🏽", "1️⃣", "が"]
+
+    def test_consecutive_flags_are_paired(self):
+        assert grapheme_clusters("🇯🇵🇺🇸") == ["🇯🇵", "🇺🇸"]
+
+
+class TestSplitText(unittest.TestCase):
+    def test_short_text_is_single_chunk(self):
+        assert split_text("こんにちは", 160) == ["こんにちは"]
+
+    def test_hard_cut_without_boundaries(self):
+        chunks = split_text("あ" * 170, 160)
+        assert [len(c) for c in chunks] == [160, 10]
+
+    def test_prefers_sentence_boundary(self):
+        text = "今日は晴れです。" * 30
+        chunks = split_text(text, 160)
+        assert all(c.endswith("。") for c in chunks)
+        assert "".join(chunks) == text
+
+    def test_prefers_line_break_over_sentence(self):
+        text = "一行目です。" * 10 + "\n" + "二行目です。" * 20
+        chunks = split_text(text, 160)
+        assert chunks[0] == "一行目です。" * 10
+
+    def test_does_not_split_emoji_sequences(self):
+        family = "👨‍👩‍👧"
+        text = family * 200
+        chunks = split_text(text, 160)
+        assert [grapheme_clusters(c) for c in chunks][0] == [family] * 160
+        assert "".join(chunks) == text
+
+    def test_does_not_split_inside_url(self):
+        url = "https://example.com/" + "a" * 50
+        text = "x" * 140 + "詳しくは" + url + " を見て。"
+        chunks = split_text(text, 160)
+        assert any(url in c for c in chunks)
+        assert all(len(grapheme_clusters(c)) <= 160 for c in chunks)
+
+    def test_url_longer_than_limit_is_cut(self):
+        url = "https://example.com/" + "a" * 300
+        chunks = split_text(url, 160)
+        assert "".join(chunks) == url
+        assert all(len(c) <= 160 for c in chunks)
+
+
+class TestTrimToSentenceEnd(unittest.TestCase):
+    def test_drops_unfinished_sentence(self):
+        assert trim_to_sentence_end("一文目です。二文目は途中") == "一文目です。"
+        assert trim_to_sentence_end("Done! and then") == "Done!"
+        assert trim_to_sentence_end("1行目\n2行目の途中") == "1行目"
+
+    def test_without_sentence_end(self):
+        assert trim_to_sentence_end("文末がない") == "文末がない"
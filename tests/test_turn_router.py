@@ -0,0 +1,68 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from src.services.turn_router import DEFAULT_RULES, Route, TurnRouter
+
+
+class TestTurnRouter(unittest.TestCase):
+    def test_default_rules(self):
+        router = TurnRouter()
+        assert router.classify("おはようございます！").name == "small_talk"
+        assert router.classify("明日の天気は？").name == "search"
+        assert router.classify("Pythonのデコレータを説明して").name == "default"
+        # Web 検索は最新情報が必要そうな入力だけ
+        assert router.classify("明日の天気は？").web_search
+        assert not router.classify("Pythonのデコレータを説明して").web_search
+        assert not router.classify("こんにちは").web_search
+        # 挨拶で始まっても本題がある場合は雑談扱いにしない
+        assert router.classify("hello, how do I use asyncio?").name == "default"
+
+    def test_small_talk_pattern_is_linear(self):
+        # 「www…」で始まり最後に一致しない入力でもバックトラックが爆発しない
+        pattern = DEFAULT_RULES[0].pattern
+        for text in ("w" * 24 + "?x", "w" * 5000 + "?x", "ww 笑 " * 1000 + "x"):
+            start = time.perf_counter()
+            assert pattern.search(text) is None
+            assert time.perf_counter() - start < 0.1
+        assert pattern.search("wwww")
+        assert pattern.search("ありがとうございます！！ www")
+        router = TurnRouter()
+        assert router.classify("www").name == "small_talk"
+
+    def test_from_file(self):
+        rules = {
+            "default": {"model": "gpt-4o-mini", "web_search": False},
+            "rules": [
+                {
+                    "name": "short",
+                    "max_chars": 5,
+                    "model": "gpt-4.1-nano",
+                    "web_search": False,
+                    "max_output_tokens": 100,
+                }
+            ],
+        }
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "rules.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(rules, f)
+            router = TurnRouter.from_file(path)
+
+        assert router.classify("やあ") == Route(
+            "short", "gpt-4.1-nano", False, max_output_tokens=100
+        )
+        assert router.classify("長めの質問をしてみます") == Route(
+            "default", "gpt-4o-mini", False
+        )
+
+    def test_stats(self):
+        router = TurnRouter()
+        for ms in (100, 200, 300):
+            router.record(Route("default"), ms / 1000)
+        stats = router.stats()["default"]
+        assert stats["count"] == 3
+        assert round(stats["avg_ms"]) == 200
+        assert round(stats["p95_ms"]) == 300
@@ -0,0 +1,73 @@
+import json
+import unittest
+
+from src.utils.webhook_prefilter import (
+    KIND_EVENT,
+    KIND_LIGHT,
+    LightMessage,
+    prefilter_events,
+)
+
+
+def _text_event(source, text="hello", mention=None, message_id="m1"):
+    message = {"type": "text", "id": message_id, "text": text}
+    if mention is not None:
+        message["mention"] = mention
+    return {"type": "message", "source": source, "message": message}
+
+
+class TestPrefilterEvents(unittest.TestCase):
+    def test_user_text_goes_to_full_pipeline(self):
+        body = json.dumps({"events": [_text_event({"type": "user", "userId": "U1"})]})
+        payload = prefilter_events(body)
+        assert len(payload.full_events) == 1
+        assert payload.light_messages == []
+
+    def test_group_text_without_mention_is_light(self):
+        event = _text_event({"type": "group", "groupId": "G1", "userId": "U1"})
+        event["message"]["markAsReadToken"] = "read_token"
+        payload = prefilter_events(json.dumps({"events": [event]}))
+        assert payload.full_events == []
+        assert payload.light_messages == [
+            LightMessage("group:G1", "U1", "m1", "hello", "read_token")
+        ]
+
+    def test_group_text_with_self_mention_goes_to_full_pipeline(self):
+        mention = {"mentionees": [{"index": 0, "length": 4, "isSelf": True}]}
+        event = _text_event({"type": "room", "roomId": "R1"}, "@bot hi", mention)
+        payload = prefilter_events(json.dumps({"events": [event]}))
+        assert len(payload.full_events) == 1
+
+    def test_mention_to_other_user_is_light(self):
+        mention = {"mentionees": [{"index": 0, "length": 4, "isSelf": False}]}
+        event = _text_event({"type": "group", "groupId": "G1"}, "@foo hi", mention)
+        payload = prefilter_events(json.dumps({"events": [event]}))
+        assert payload.light_messages[0].user_id == "unknown"
+
+    def test_non_text_events_are_skipped_and_join_is_kept(self):
+        events = [
+            {"type": "message", "message": {"type": "sticker", "id": "s1"}},
+            {"type": "unfollow", "source": {"type": "user", "userId": "U1"}},
+            {"type": "join", "source": {"type": "group", "groupId": "G1"}},
+        ]
+        payload = prefilter_events(json.dumps({"destination": "D", "events": events}))
+        assert payload.destination == "D"
+        assert payload.skipped == 2
+        assert [e["type"] for e in payload.full_events] == ["join"]
+
+    def test_items_keep_arrival_order(self):
+        # メンション付きの質問の後に届いた発言が、質問より先に履歴へ入らない
+        mention = {"mentionees": [{"index": 0, "length": 4, "isSelf": True}]}
+        source = {"type": "group", "groupId": "G1", "userId": "U1"}
+        events = [
+            _text_event(source, "before", message_id="m1"),
+            _text_event(source, "@bot question", mention, message_id="m2"),
+            _text_event(source, "later msg", message_id="m3"),
+        ]
+        payload = prefilter_events(json.dumps({"events": events}))
+        assert [kind for kind, _ in payload.items] == [
+            KIND_LIGHT,
+            KIND_EVENT,
+            KIND_LIGHT,
+        ]
+        assert [m.text for m in payload.light_messages] == ["before", "later msg"]
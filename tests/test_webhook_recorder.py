@@ -0,0 +1,131 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src.utils.anonymizer import mask_text, pseudonymize_ids
+from src.utils.webhook_recorder import (
+    DUMMY_TOKEN,
+    WebhookRecorder,
+    anonymize_webhook_body,
+)
+
+USER_ID = "U" + "a" * 32
+GROUP_ID = "G" + "b" * 32
+
+
+def _body(text: str) -> str:
+    return json.dumps(
+        {
+            "destination": "U" + "c" * 32,
+            "events": [
+                {
+                    "type": "message",
+                    "replyToken": "real_reply_token",
+                    "timestamp": 1700000000000,
+                    "source": {"type": "group", "groupId": GROUP_ID, "userId": USER_ID},
+                    "message": {
+                        "type": "text",
+                        "id": "123",
+                        "text": text,
+                        "markAsReadToken": "real_read_token",
+                        "mention": {
+                            "mentionees": [{"index": 0, "length": 4, "isSelf": True}]
+                        },
+                    },
+                }
+            ],
+        }
+    )
+
+
+class TestAnonymizeHelpers(unittest.TestCase):
+    def test_pseudonymize_is_stable_and_keeps_format(self):
+        text = f"{USER_ID} {USER_ID} {GROUP_ID}"
+        first = pseudonymize_ids(text, "salt")
+        assert first == pseudonymize_ids(text, "salt")
+        a, b, g = first.split()
+        assert a == b and a != USER_ID
+        assert a.startswith("U") and len(a) == 33
+        assert g.startswith("G") and len(g) == 33
+        assert pseudonymize_ids(text, "other") != first
+
+    def test_mask_text_keeps_length_and_layout(self):
+        masked = mask_text("@bot 明日の天気は？ abc 123")
+        assert masked == "@xxx ああああああ？ xxx xxx"
+
+
+class TestWebhookRecorder(unittest.TestCase):
+    def test_anonymize_body(self):
+        body = json.loads(anonymize_webhook_body(_body("@bot 今日の予定"), "salt"))
+        event = body["events"][0]
+        assert event["replyToken"] == DUMMY_TOKEN
+        assert event["message"]["markAsReadToken"] == DUMMY_TOKEN
+        assert event["message"]["text"] == "@xxx あああああ"
+        assert event["source"]["userId"] != USER_ID
+        assert event["message"]["mention"]["mentionees"][0]["isSelf"] is True
+        assert event["timestamp"] == 1700000000000
+
+    def test_only_replay_fields_are_recorded(self):
+        # 位置情報の住所・座標やファイル名などの自由記述は記録しない
+        body = json.dumps(
+            {
+                "destination": "U" + "c" * 32,
+                "events": [
+                    {
+                        "type": "message",
+                        "source": {"type": "user", "userId": USER_ID},
+                        "message": {
+                            "type": "location",
+                            "id": "1",
+                            "title": "自宅",
+                            "address": "東京都港区六本木1-2-3",
+                            "latitude": 35.66,
+                            "longitude": 139.73,
+                        },
+                    },
+                    {
+                        "type": "message",
+                        "source": {"type": "user", "userId": USER_ID},
+                        "message": {
+                            "type": "file",
+                            "id": "2",
+                            "fileName": "山田太郎_履歴書.pdf",
+                            "fileSize": 2048,
+                        },
+                    },
+                    {
+                        "type": "postback",
+                        "source": {"type": "user", "userId": USER_ID},
+                        "postback": {"data": "予約=山田", "params": {"date": "x"}},
+                        "beacon": {"hwid": "d41d8cd98f", "dm": "secret"},
+                    },
+                ],
+            },
+            ensure_ascii=False,
+        )
+        recorded = anonymize_webhook_body(body, "salt")
+        for secret in ("六本木", "自宅", "35.66", "139.73", "山田", "履歴書", "hwid"):
+            assert secret not in recorded
+        events = json.loads(recorded)["events"]
+        assert events[0]["message"] == {"type": "location", "id": "1"}
+        assert events[1]["message"] == {"type": "file", "id": "2"}
+        assert events[2]["postback"] == {"data": mask_text("予約=山田")}
+
+    def test_exit_command_is_kept(self):
+        body = json.loads(anonymize_webhook_body(_body("/exit"), "salt"))
+        assert body["events"][0]["message"]["text"] == "/exit"
+
+    def test_record_appends_jsonl(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "capture.jsonl")
+            recorder = WebhookRecorder(path, salt="salt")
+            recorder.record(_body("こんにちは"), 100.0)
+            recorder.record("not json", 101.0)
+            recorder.record(_body("またね"), 102.5)
+            recorder.close()
+
+            with open(path, encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f]
+        assert [line["ts"] for line in lines] == [100.0, 102.5]
+        assert USER_ID not in lines[0]["body"]